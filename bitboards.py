@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+from collections import defaultdict
+
+
+class Bitboards:
+    # ray masks only depend on the board geometry, hence shared between
+    #  instances and indexed by [(size, board)]
+    _geometries = {}
+
+    # bit n stands for index n of the Position mailbox, so that a step of
+    #  delta squares is a shift by delta bits and the mailbox border keeps
+    #  leaps from wrapping around to the other side of the board
+    def __init__(self, squares):
+        # squares is indexed by [index] and holds (file, rank), or None for
+        #  indices outside the board
+        self._size = len(squares)
+        self._board = 0
+        self._files = defaultdict(int)
+        self._ranks = defaultdict(int)
+        for index, square in enumerate(squares):
+            if square:
+                file, rank = square
+                bit = 1 << index
+                self._board |= bit
+                self._files[file] |= bit
+                self._ranks[rank] |= bit
+
+        self._occupied = 0
+        self._players = [0, 0]
+        self._pieces = defaultdict(int)  # indexed by [piece], e.g. 'P' or 'p'
+
+        # the following data structures are indexed by [delta][index] (then
+        #  [range-1] for the cumulative masks of _rays)
+        self._rays, self._full_rays = self._geometries.setdefault(
+                (self._size, self._board), ({}, {}))
+
+    @property
+    def board(self):
+        return self._board
+
+    @property
+    def occupied(self):
+        return self._occupied
+
+    @property
+    def empty(self):
+        return self._board & ~self._occupied
+
+    def player(self, player):
+        return self._players[player]
+
+    def piece(self, piece):
+        return self._pieces[piece]
+
+    def file(self, file):
+        return self._files[file]
+
+    def rank(self, rank):
+        return self._ranks[rank]
+
+    def toggle(self, index, piece, player):
+        # adds the piece on an empty square, or removes it from its square
+        bit = 1 << index
+        self._occupied ^= bit
+        self._players[player] ^= bit
+        self._pieces[piece] ^= bit
+
+    def ray(self, index, delta, range=0):
+        # squares reached by repeated steps of delta from index (excluded),
+        #  up to range steps if range is not 0
+        if range == 0:
+            return self.full_rays(delta)[index]
+
+        masks = self._rays[delta][index] if delta in self._rays else \
+            self._compute_rays(delta)[index]
+        if not masks:
+            return 0
+        return masks[min(range, len(masks)) - 1]
+
+    def full_rays(self, delta):
+        # i.e. ray(index, delta) for all indices, as a list
+        result = self._full_rays.get(delta)
+        if result is None:
+            self._compute_rays(delta)
+            result = self._full_rays[delta]
+        return result
+
+    def _compute_rays(self, delta):
+        rays = self._rays[delta] = []  # cumulative masks, one per step
+        full_rays = self._full_rays[delta] = []
+
+        for index in range(self._size):
+            masks = []
+            mask = 0
+            if (self._board >> index) & 1:
+                dest_index = index + delta
+                while 0 <= dest_index < self._size and \
+                        (self._board >> dest_index) & 1:
+                    mask |= 1 << dest_index
+                    masks.append(mask)
+                    dest_index += delta
+            rays.append(masks)
+            full_rays.append(mask)
+
+        return rays
+
+    def shift(self, mask, delta):
+        # moves every square of mask by delta, dropping those leaving the board
+        if delta > 0:
+            return (mask << delta) & self._board
+        else:
+            return (mask >> -delta) & self._board
+
+    def attacks(self, index, delta, range, occupied=None):
+        # squares attacked from index in direction delta, i.e. up to (and
+        #  including) the first occupied square (according to occupied if
+        #  provided)
+        if range == 1:  # leaper
+            return self.shift(1 << index, delta)
+
+        ray = self.ray(index, delta, range)
+        blockers = ray & (self._occupied if occupied is None else occupied)
+        if not blockers:
+            return ray
+
+        nearest = self.nearest(blockers, delta)
+        if delta > 0:
+            return ray & ((1 << (nearest + 1)) - 1)
+        else:
+            return ray & -(1 << nearest)
+
+    @staticmethod
+    def nearest(mask, delta):
+        # index of the set bit met first when walking in direction delta
+        if delta > 0:
+            return (mask & -mask).bit_length() - 1
+        else:
+            return mask.bit_length() - 1
+
+    @staticmethod
+    def indices(mask):
+        while mask:
+            bit = mask & -mask
+            yield bit.bit_length() - 1
+            mask ^= bit
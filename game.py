@@ -18,13 +18,17 @@ class Game:
     def __getattr__(self, name):
         return getattr(self._position, name)
 
+    @property
+    def position(self):
+        return self._position
+
     @property
     def half_moves(self):
         return self._half_moves
 
     @property
     def sfen(self):
-        return self._sfen
+        return str(self._position)
 
     def result(self):
         return self._winner, self._result_reason
@@ -53,11 +57,21 @@ class Game:
         if promotes is not None:
             self._update_history()
 
+    def apply_move(self, square, dest_square, promotes=False):
+        # no check at all, see Position.apply_move
+        self._position.apply_move(square, dest_square, promotes)
+        self._update_history()
+
     def legal_moves_from_square(self, square, player=None):
         if self._winner is not None:
             return
         yield from self._position.legal_moves_from_square(square, player)
 
+    def legal_moves(self):
+        if self._winner is not None:
+            return []
+        return self._position.legal_moves()
+
     def choose_promotion(self, promotes):
         self._position.choose_promotion(promotes)
         self._update_history()
@@ -69,6 +83,32 @@ class Game:
         self._position.drop(abbrev, dest_square)
         self._update_history()
 
+    def apply_drop(self, abbrev, dest_square):
+        # no check at all, see Position.apply_drop
+        self._position.apply_drop(abbrev, dest_square)
+        self._update_history()
+
+    def push(self, move):
+        # no check at all, see Position.push
+        self._position.push(move)
+        self._update_history()
+
+    def pop(self):
+        # i.e. undo the last move or drop, including its effect on the result
+        move = self._position.pop()
+
+        keys = self._keys[self._key]
+        keys.pop()
+        if not keys:
+            del self._keys[self._key]
+        self._in_check.pop()
+        self._half_moves -= 1
+
+        self._key = self._position.key
+        self._status = self.status()
+        self._update_result()
+        return move
+
     def legal_drops_with_piece(self, abbrev):
         if self._winner is not None:
             return
@@ -79,19 +119,19 @@ class Game:
 
         if not hasattr(self, '_half_moves'):
             self._half_moves = 0
-            self._sfens = defaultdict(list)
+            self._keys = defaultdict(list)  # Zobrist key -> half moves
             self._in_check = []
         else:
             self._half_moves += 1
 
-        self._sfen = str(self._position)
-        self._sfens[self._sfen].append(self._half_moves)
+        self._key = self._position.key
+        self._keys[self._key].append(self._half_moves)
         self._in_check.append(self._status.startswith('check'))
 
         self._update_result()
 
     def _fourfold_repetition_result(self):
-        if len(self._sfens[self._sfen]) < 4:
+        if len(self._keys[self._key]) < 4:
             return None, 'in progress'  # no four-fold repetition
 
         # receiving perpetual check
@@ -106,11 +146,11 @@ class Game:
         return self.NUM_PLAYERS, 'fourfold repetition'  # draw
 
     def _is_perpetual_check(self, offset):
-        assert self._sfens[self._sfen][3] == self._half_moves
+        assert self._keys[self._key][3] == self._half_moves
 
         return all(self._in_check[half_moves] for half_moves in
-                   range(self._sfens[self._sfen][2] - offset
+                   range(self._keys[self._key][2] - offset
                                                     + self.NUM_PLAYERS,  # noqa
-                         self._sfens[self._sfen][3] - offset
+                         self._keys[self._key][3] - offset
                                                     + self.NUM_PLAYERS,  # noqa
                          self.NUM_PLAYERS))
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+import argparse
+import math
+import random
+import time
+
+from game import Game
+from perft import STARTING_POSITIONS, format_move
+from pieces import Pieces
+
+
+class _Node:
+    __slots__ = ('move', 'player', 'parent', 'children', 'untried',
+                 'visits', 'wins')
+
+    def __init__(self, move, player, parent):
+        self.move = move  # i.e. packed move or drop leading here
+        self.player = player  # i.e. who played it
+        self.parent = parent
+        self.children = []
+        self.untried = None  # i.e. moves without child yet, once known
+        self.visits = 0
+        self.wins = 0  # for player, draws counting as half a win
+
+
+class Mcts:
+    # Monte Carlo tree search (UCT) of the best move or drop for the player
+    #  to move of a Game, without any evaluation: each playout plays random
+    #  legal moves until the game is decided (see Game.result, including the
+    #  try rule and repetitions) or max_plies plies, which counts as a draw.
+    DEFAULT_EXPLORATION = math.sqrt(2)
+    DEFAULT_MAX_PLIES = 200
+
+    def __init__(self, game, exploration=DEFAULT_EXPLORATION,
+                 max_plies=DEFAULT_MAX_PLIES, seed=None):
+        self._game = game
+        self._exploration = exploration
+        self._max_plies = max_plies
+        self._random = random.Random(seed)
+        self._root = _Node(None, None, None)
+
+        self.playouts = 0
+        self.playout_plies = 0  # i.e. total, see average_playout_plies
+        self.max_playout_plies = 0
+        self.max_tree_depth = 0
+        self.elapsed = 0
+
+    @property
+    def playouts_per_second(self):
+        return self.playouts / self.elapsed if self.elapsed else 0
+
+    @property
+    def average_playout_plies(self):
+        return self.playout_plies / self.playouts if self.playouts else 0
+
+    def run(self, max_playouts=None, max_time=None, stop=None):
+        # returns the most visited move (packed, see Move), or None if the
+        #  game is already decided. The search goes on (with the same tree
+        #  if called again) until max_playouts playouts in total, max_time
+        #  seconds, or as soon as stop (e.g. a threading.Event) is set.
+        if max_playouts is None and max_time is None and stop is None:
+            raise ValueError('Unlimited search')
+
+        start = time.perf_counter()
+        deadline = None if max_time is None else start + max_time
+        while (max_playouts is None or self.playouts < max_playouts) and \
+              (deadline is None or time.perf_counter() < deadline) and \
+              (stop is None or not stop.is_set()):
+            if not self._iterate():
+                break  # i.e. game already decided
+        self.elapsed += time.perf_counter() - start
+
+        return max(self._root.children, key=lambda child: child.visits,
+                   default=_Node(None, None, None)).move
+
+    def statistics(self):
+        # returns [(move, visits, win rate)] for each move tried from the
+        #  current position, most visited first
+        return [(child.move, child.visits, child.wins / child.visits)
+                for child in sorted(self._root.children,
+                                    key=lambda child: -child.visits)]
+
+    def _iterate(self):
+        # i.e. selection, expansion, playout then backpropagation; returns
+        #  False if the game is already decided
+        game = self._game
+        node = self._root
+        depth = 0
+
+        while not node.untried and node.children:
+            node = self._select(node)
+            game.push(node.move)
+            depth += 1
+
+        if node.untried is None:
+            node.untried = game.legal_moves()  # i.e. none once decided
+            self._random.shuffle(node.untried)
+        if node.untried:
+            child = _Node(node.untried.pop(), game.player_to_move, node)
+            node.children.append(child)
+            node = child
+            game.push(node.move)
+            depth += 1
+        elif depth == 0:
+            return False
+
+        winner = self._playout()
+        for _ in range(depth):
+            game.pop()
+        self.max_tree_depth = max(self.max_tree_depth, depth)
+
+        while node is not self._root:
+            node.visits += 1
+            if winner == node.player:
+                node.wins += 1
+            elif winner is None or winner == game.NUM_PLAYERS:
+                node.wins += 0.5  # i.e. draw or no result
+            node = node.parent
+        node.visits += 1
+        return True
+
+    def _select(self, node):
+        # i.e. child with the best upper confidence bound
+        factor = self._exploration * math.sqrt(math.log(node.visits))
+        return max(node.children,
+                   key=lambda child: child.wins / child.visits +
+                   factor / math.sqrt(child.visits))
+
+    def _playout(self):
+        # returns the winner (see Game.result) of a random game from the
+        #  current position, which is left unchanged
+        game = self._game
+        plies = 0
+        while game.result()[0] is None and plies < self._max_plies:
+            game.push(game.position.random_move(self._random))
+            plies += 1
+        winner = game.result()[0]
+
+        for _ in range(plies):
+            game.pop()
+        self.playouts += 1
+        self.playout_plies += plies
+        self.max_playout_plies = max(self.max_playout_plies, plies)
+        return winner
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('position',
+                        help='SFEN position, or one of: {}'.format(
+                            ', '.join(STARTING_POSITIONS)))
+    parser.add_argument('--playouts', type=int,
+                        help='maximum number of playouts')
+    parser.add_argument('--time', type=float, metavar='SECONDS',
+                        help='maximum search time')
+    parser.add_argument('--max-plies', type=int,
+                        default=Mcts.DEFAULT_MAX_PLIES,
+                        help='maximum length of playouts (default: {})'
+                             .format(Mcts.DEFAULT_MAX_PLIES))
+    parser.add_argument('--try-rule', action='store_true',
+                        help='a royal piece reaching the initial square of '
+                             'the opponent one wins')
+    parser.add_argument('--seed', type=int, help='random seed')
+    args = parser.parse_args()
+    if args.playouts is None and args.time is None:
+        parser.error('at least one of --playouts and --time is needed')
+
+    sfen = STARTING_POSITIONS.get(args.position, args.position)
+    game = Game(sfen, Pieces(), args.try_rule)
+    mcts = Mcts(game, max_plies=args.max_plies, seed=args.seed)
+    move = mcts.run(args.playouts, args.time)
+
+    for child_move, visits, win_rate in mcts.statistics()[:5]:
+        print('{}: {} visits, {:.1%} wins'.format(
+            format_move(game.unpack_move(child_move)), visits, win_rate))
+    print('Best move: {}'.format(
+        format_move(game.unpack_move(move)) if move else 'none'))
+    print('Playouts: {}'.format(mcts.playouts))
+    print('Plies per playout: {:.1f} on average, {} at most'.format(
+        mcts.average_playout_plies, mcts.max_playout_plies))
+    print('Tree depth: {}'.format(mcts.max_tree_depth))
+    print('Time: {:.3f}s ({:.1f} playouts/s)'.format(
+        mcts.elapsed, mcts.playouts_per_second))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+
+class Move:
+    # A move or drop packed in a single int, with indices of the Position
+    #  mailbox (see Position.pack_move and Position.unpack_move):
+    #   - bits 0 to INDEX_BITS-1: destination index
+    #   - next INDEX_BITS bits: origin index (0 for drops)
+    #   - next bit: whether the piece promotes
+    #   - remaining bits: 1 + position of the dropped piece among
+    #      Position.droppable_pieces (0 for moves)
+    INDEX_BITS = 12
+    INDEX_MASK = (1 << INDEX_BITS) - 1
+    ORIGIN_SHIFT = INDEX_BITS
+    PROMOTION_FLAG = 1 << (2 * INDEX_BITS)
+    DROP_SHIFT = 2 * INDEX_BITS + 1
+
+    __slots__ = ('_value',)
+
+    def __init__(self, value):
+        self._value = value
+
+    @classmethod
+    def pack(cls, index, dest_index, promotes=False):
+        return index << cls.ORIGIN_SHIFT | dest_index | \
+            (cls.PROMOTION_FLAG if promotes else 0)
+
+    @classmethod
+    def pack_drop(cls, drop_id, dest_index):
+        return drop_id << cls.DROP_SHIFT | dest_index
+
+    @classmethod
+    def from_tuple(cls, position, move):
+        return cls(position.pack_move(move))
+
+    def to_tuple(self, position):
+        return position.unpack_move(self._value)
+
+    @property
+    def value(self):
+        return self._value
+
+    @property
+    def index(self):
+        # i.e. None for drops
+        index = (self._value >> self.ORIGIN_SHIFT) & self.INDEX_MASK
+        return index if index else None
+
+    @property
+    def dest_index(self):
+        return self._value & self.INDEX_MASK
+
+    @property
+    def promotes(self):
+        return bool(self._value & self.PROMOTION_FLAG)
+
+    @property
+    def drop_id(self):
+        # i.e. 0 for moves
+        return self._value >> self.DROP_SHIFT
+
+    def is_drop(self):
+        return self._value >> self.DROP_SHIFT != 0
+
+    def __int__(self):
+        return self._value
+
+    def __eq__(self, other):
+        return isinstance(other, Move) and self._value == other._value
+
+    def __hash__(self):
+        return hash(self._value)
+
+    def __repr__(self):
+        return 'Move({})'.format(self._value)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import time
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from pieces import Pieces
+from position import Position
+from shared_transposition import SharedTranspositionTable
+from transposition import TranspositionTable
+
+STARTING_POSITIONS = {
+    'standard': 'lnsgkgsnl/1r5b1/ppppppppp/9/9/9/PPPPPPPPP/1B5R1/LNSGKGSNL '
+                'b -',
+    'wa': 'lh@cm@sc@fg@vs@kvw@fc@so@bd@oc@/1ce@1tf@1ff@1rr@1sw@1/'
+          'ppppppppppp/11/11/11/11/11/PPPPPPPPPPP/1SW@1RR@1FF@1TF@1CE@1/'
+          'OC@BD@SO@FC@VW@KVS@FG@SC@CM@LH@ b -',
+    'tori': "r'p'c'kc'p'l'/3f'3/s's's's's's's'/2s'1S'2/S'S'S'S'S'S'S'/"
+            "3F'3/L'P'C'KC'P'R' b -",
+    'okisaki': "lnsgkq'gsnl/a'n'1r2b1n'a'/pppppppppp/10/10/10/10/"
+               "PPPPPPPPPP/A'N'1B2R1N'A'/LNSGQ'KGSNL b -",
+}
+
+# number of leaf nodes from the starting positions, indexed by [variant]
+#  then [depth-1]
+REFERENCE_COUNTS = {
+    'standard': [30, 900, 25470, 719731],
+    'wa': [34, 1156, 39032, 1317900],
+    'tori': [17, 288, 5445, 104381],
+    'okisaki': [27, 729, 20194, 559378],
+}
+
+
+class Perft:
+    def __init__(self, position):
+        self._position = position
+
+    def count(self, depth):
+        # i.e. number of leaf nodes after depth moves or drops, with one node
+        #  per promotion choice
+        if depth == 0:
+            return 1
+
+        position = self._position
+        moves = position.legal_moves()
+        if depth == 1:
+            return len(moves)
+
+        result = 0
+        for move in moves:
+            position.push(move)
+            result += self.count(depth - 1)
+            position.pop()
+        return result
+
+    def cached_count(self, depth, table):
+        # same as count() but remembers counts of subtrees in a
+        #  TranspositionTable, since different move orders often reach the
+        #  same position
+        if depth == 0:
+            return 1
+
+        position = self._position
+        entry = table.probe(position.key)
+        if entry and entry[0] == depth:
+            return entry[1]
+
+        moves = position.legal_moves()
+        if depth == 1:
+            result = len(moves)
+        else:
+            result = 0
+            for move in moves:
+                position.push(move)
+                result += self.cached_count(depth - 1, table)
+                position.pop()
+
+        table.store(position.key, depth, result)
+        return result
+
+    def divide(self, depth):
+        # returns {move: count} for each legal move or drop of the player to
+        #  move, where move is a tuple accepted by Position.push()
+        if depth < 1:
+            raise ValueError('Invalid depth for divide: {}'.format(depth))
+
+        position = self._position
+        result = {}
+        for move in position.legal_moves():
+            position.push(move)
+            result[position.unpack_move(move)] = self.count(depth - 1)
+            position.pop()
+        return result
+
+    def parallel_count(self, depth, max_workers=None, split_depth=1,
+                       table=None):
+        # same as count() but the subtrees after split_depth moves or drops
+        #  are counted by a pool of processes, sharing table if provided (see
+        #  SharedTranspositionTable and cached_count()); returns (count,
+        #  stats) where stats is indexed by [pid] and holds (nodes, seconds)
+        if depth <= split_depth:
+            return self.count(depth), {}
+
+        sfens = list(self._sfens(split_depth))
+        pieces = self._position.pieces
+        stats = defaultdict(lambda: (0, 0))
+        result = 0
+        with ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                 initargs=(pieces, table)) as executor:
+            for nodes, seconds, pid in executor.map(
+                    _count_subtree, sfens,
+                    [depth - split_depth] * len(sfens)):
+                result += nodes
+                pid_nodes, pid_seconds = stats[pid]
+                stats[pid] = pid_nodes + nodes, pid_seconds + seconds
+        return result, dict(stats)
+
+    def _sfens(self, depth):
+        # i.e. SFEN of each position reached after depth moves or drops
+        position = self._position
+        if depth == 0:
+            yield str(position)
+            return
+
+        for move in position.legal_moves():
+            position.push(move)
+            yield from self._sfens(depth - 1)
+            position.pop()
+
+
+def _init_worker(pieces, table):
+    # unpickled once per worker process, so that move tables are shared
+    #  between its positions
+    global _worker_pieces, _worker_table
+    _worker_pieces = pieces
+    _worker_table = table
+    if table is not None:
+        table.close_at_exit()
+
+
+def _count_subtree(sfen, depth):
+    # run by worker processes, which rebuild the position from scratch
+    start = time.perf_counter()
+    perft = Perft(Position(sfen, _worker_pieces))
+    if _worker_table is None:
+        nodes = perft.count(depth)
+    else:
+        nodes = perft.cached_count(depth, _worker_table)
+    return nodes, time.perf_counter() - start, os.getpid()
+
+
+def format_move(move):
+    if isinstance(move[0], str):
+        abbrev, (dest_file, dest_rank) = move
+        return '{}*{}{}'.format(abbrev, dest_file, dest_rank)
+    else:
+        (file, rank), (dest_file, dest_rank), promotes = move
+        return '{}{}-{}{}{}'.format(file, rank, dest_file, dest_rank,
+                                    '+' if promotes else '')
+
+
+def _print_table(table):
+    if isinstance(table, SharedTranspositionTable):
+        # counters are per process, hence not shown
+        print('Hash: {:.1%} used'.format(table.usage()))
+        table.close()
+    else:
+        print('Hash: {} hits, {} misses, {} stores, {} replacements, '
+              '{:.1%} used'.format(table.hits, table.misses, table.stores,
+                                   table.replacements, table.usage()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('position',
+                        help='SFEN position, or one of: {}'.format(
+                            ', '.join(STARTING_POSITIONS)))
+    parser.add_argument('depth', type=int, help='number of plies')
+    parser.add_argument('--divide', action='store_true',
+                        help='show the count after each legal move or drop')
+    parser.add_argument('--jobs', '-j', type=int, nargs='?', const=0,
+                        help='count in parallel with this many processes '
+                             '(default: number of CPUs)')
+    parser.add_argument('--split-depth', type=int, default=1,
+                        help='number of plies played before handing '
+                             'positions over to processes (default: 1)')
+    parser.add_argument('--hash', type=int, metavar='MB',
+                        help='remember subtree counts in a transposition '
+                             'table of this size, shared by processes with '
+                             '--jobs')
+    args = parser.parse_args()
+    if args.divide and (args.jobs is not None or args.hash is not None):
+        parser.error('--divide excludes --jobs and --hash')
+
+    sfen = STARTING_POSITIONS.get(args.position, args.position)
+    perft = Perft(Position(sfen, Pieces()))
+
+    start = time.perf_counter()
+    stats = {}
+    table = None
+    if args.divide:
+        counts = perft.divide(args.depth)
+        for move in sorted(counts, key=format_move):
+            print('{}: {}'.format(format_move(move), counts[move]))
+        nodes = sum(counts.values())
+    elif args.jobs is not None:
+        table = SharedTranspositionTable(args.hash << 20) \
+            if args.hash is not None else None
+        nodes, stats = perft.parallel_count(args.depth, args.jobs or None,
+                                            args.split_depth, table)
+    elif args.hash is not None:
+        table = TranspositionTable(args.hash << 20)
+        nodes = perft.cached_count(args.depth, table)
+    else:
+        nodes = perft.count(args.depth)
+    elapsed = time.perf_counter() - start
+
+    for pid, (pid_nodes, seconds) in sorted(stats.items()):
+        print('Process {}: {} nodes in {:.3f}s ({:.0f} nodes/s)'.format(
+            pid, pid_nodes, seconds, pid_nodes / seconds if seconds else 0))
+
+    print('Nodes: {}'.format(nodes))
+    reference_counts = REFERENCE_COUNTS.get(args.position, [])
+    if args.depth <= len(reference_counts):
+        expected = reference_counts[args.depth - 1]
+        print('Expected: {} ({})'.format(
+            expected, 'OK' if nodes == expected else 'MISMATCH'))
+    print('Time: {:.3f}s ({:.0f} nodes/s)'.format(
+        elapsed, nodes / elapsed if elapsed else 0))
+    if table:
+        _print_table(table)
@@ -12,6 +12,10 @@ class PiecesException(Exception):
 
 
 class Pieces:
+    # rough material values, see value()
+    ROYAL_VALUE = 1000
+    RIDER_VALUE = 4  # per direction with unlimited range
+
     def __init__(self, filename='pieces.yaml'):
         with open(filename, 'r', encoding='utf-8') as stream:
             doc = yaml.safe_load(stream)
@@ -118,6 +122,14 @@ class Pieces:
     def directions(self, abbrev):
         return self._betza[abbrev].directions
 
+    def value(self, abbrev):
+        # i.e. number of squares reached in each direction on an otherwise
+        #  empty board, to order captures without any per-variant table
+        if self.is_royal(abbrev):
+            return self.ROYAL_VALUE
+        return sum(piece_range or self.RIDER_VALUE
+                   for piece_range in self.directions(abbrev).values())
+
     def num_restricted_furthest_ranks(self, abbrev):
         return self._betza[abbrev].num_restricted_furthest_ranks()
 
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 
+import random
 import re
 
+from bitboards import Bitboards
 from collections import defaultdict, Counter
+from move import Move
 
 
 class Position:
@@ -11,6 +14,26 @@ class Position:
     STANDARD_HAND_ORDER = 'RBGSNLP'
     UNPROMOTED_PIECE_REGEX = "[a-zA-Z](?:[a-zA-Z](?=@)|')?"
 
+    # the longest Betza leap (e.g. G, H or Z) spans 3 files or ranks, so a
+    #  border that wide keeps every single step from a board square inside the
+    #  mailbox
+    BORDER = 3
+    OFF_BOARD = '#'
+
+    # move tables only depend on the pieces and on the board size, hence
+    #  shared between instances and indexed by [(pieces, num_files, num_ranks)]
+    _MOVE_TABLES = {}
+
+    DROP_MATES_CACHE_SIZE = 1 << 16
+    STATUSES_CACHE_SIZE = 1 << 16
+
+    # Zobrist keys are seeded with strings so that they do not change between
+    #  runs or processes, see _build_zobrist_keys and _hand_key
+    ZOBRIST_BITS = 64
+    _ZOBRIST_PLAYER = random.Random('player').getrandbits(ZOBRIST_BITS)
+    _ZOBRIST_HANDS = {}  # indexed by [(player, abbrev, number)]
+    _ZOBRIST_PIECES = {}  # indexed by [(piece, mailbox size)] then [index]
+
     def __init__(self, sfen, pieces):
         self._pieces = pieces
 
@@ -18,10 +41,10 @@ class Position:
         if not m:
             raise ValueError('Invalid SFEN')
 
-        # the following data structure is indexed by [(file, rank)]
+        # the following data structure is a mailbox indexed by [index] (see
+        #  _index), with OFF_BOARD sentinels around the board
         # rank=1 and file=1 is top-right corner from black's point of view, for
         #  consistency with Japanese notation
-        self._board = {}
         self._parse_board(m.group(1))
 
         self._player_to_move = self._player_from_code(m.group(2))
@@ -32,10 +55,26 @@ class Position:
         self._parse_hands(m.group(3))
 
         self._update_droppable_pieces()
+        self._build_move_tables()
+        self._build_attack_maps()
+        self._build_zobrist_keys()
+        self._build_material()
 
         self._checking_piece = \
             self._piece_giving_check_to(self._player_to_move)
 
+        # the following data structure holds one record per move or drop,
+        #  see _make_move and _make_drop
+        self._undo_stack = []
+
+        # the following data structure is indexed by [(key, piece, index)]
+        #  and caches _is_drop_mate() results
+        self._drop_mates = {}
+
+        # the following data structure is indexed by [key] and caches
+        #  (status(), checking piece)
+        self._statuses = {}
+
     @property
     def pieces(self):
         return self._pieces
@@ -56,14 +95,38 @@ class Position:
     def player_to_move(self):
         return self._player_to_move
 
+    @property
+    def key(self):
+        # i.e. Zobrist hash of the board, hands and player to move
+        return self._key
+
+    def material(self, player):
+        # i.e. total value (see Pieces.value) of his pieces on board and in
+        #  hand, royal pieces excepted
+        return self._material[player]
+
     def get(self, square):
-        return self._board.get(square)
+        if self._is_on_board(square):
+            return self._board[self._index(square)]
+
+    def _is_on_board(self, square):
+        file, rank = square
+        return 1 <= file <= self._num_files and 1 <= rank <= self._num_ranks
 
     def in_hand(self, player):
         return self._hands[player]  # please don't modify me!
 
+    def is_attacked(self, square, player):
+        # i.e. by one of his pieces
+        return self._attacks[player][self._index(square)] > 0
+
+    def attackers(self, square, player):
+        return [self._squares[index]
+                for index in self._attackers(self._index(square), player)]
+
     def royal_square(self, player):
-        return self._royal_squares[player]
+        index = self._royal_squares[player]
+        return None if index is None else self._squares[index]
 
     def __str__(self):
         return ' '.join([self._sfen_board(),
@@ -78,6 +141,16 @@ class Position:
                              self.MIN_SIZE))
 
         self._all_coordinates = set()
+        self._abbrevs = set()  # i.e. found on board or in hand, or promoted
+        self._rider_coordinates = set()
+        # the following data structure is indexed by [player] and holds
+        #  (coordinate, delta, rays) to walk from his royal piece towards the
+        #  pieces which could check him, where rays is indexed by [index]
+        self._check_deltas = [[] for count in range(self.NUM_PLAYERS)]
+        # the following data structure holds (player, coordinate, delta, rays)
+        #  to walk from a square towards his pieces which could attack through
+        #  it, where rays is indexed by [index]
+        self._rider_lines = []
         self._droppable_pieces = set()  # later transformed to a list
 
         self._num_files = 0
@@ -94,9 +167,136 @@ class Position:
             raise ValueError('Too few files: {} < {}'.format(self._num_files,
                              self.MIN_SIZE))
 
+        self._create_mailbox()
+
         for rank, sfen_rank in enumerate(ranks, 1):
             self._parse_rank(sfen_rank, rank, True)
 
+    def _create_mailbox(self):
+        self._stride = self._num_files + 2 * self.BORDER
+        size = (self._num_ranks + 2 * self.BORDER) * self._stride
+        if size > 1 << Move.INDEX_BITS:
+            raise ValueError('Too many squares for packed moves: {} > {}'
+                             .format(size, 1 << Move.INDEX_BITS))
+
+        self._board = [self.OFF_BOARD] * size
+        self._squares = [None] * size  # i.e. (file, rank) for each index
+        self._files = [None] * size
+        self._ranks = [None] * size
+        self._board_indices = []  # rank by rank, then file by file
+
+        for rank in range(1, self._num_ranks+1):
+            for file in range(1, self._num_files+1):
+                index = self._index((file, rank))
+                self._board[index] = None
+                self._squares[index] = file, rank
+                self._files[index] = file
+                self._ranks[index] = rank
+                self._board_indices.append(index)
+
+        # the following data structure mirrors the mailbox occupancy
+        self._bitboards = Bitboards(self._squares)
+
+        # the following data structure is indexed by [player] and caches
+        #  _checks_and_pins() until the board changes
+        self._safety = [None] * self.NUM_PLAYERS
+
+    def _index(self, square):
+        file, rank = square
+        return (rank + self.BORDER - 1) * self._stride + file + self.BORDER - 1
+
+    def _put(self, index, piece):
+        self._update_lines_through(index, -1)  # my piece now blocks them
+        self._board[index] = piece
+        self._bitboards.toggle(index, piece, piece.upper() != piece)
+        self._update_attacks_from(index, piece, 1)
+        self._safety = [None] * self.NUM_PLAYERS
+        self._key ^= self._piece_keys[piece][index]
+        self._material[piece.upper() != piece] += self._values[piece]
+
+    def _remove(self, index):
+        piece = self._board[index]
+        self._update_attacks_from(index, piece, -1)
+        self._board[index] = None
+        self._bitboards.toggle(index, piece, piece.upper() != piece)
+        self._update_lines_through(index, 1)  # no longer blocked
+        self._safety = [None] * self.NUM_PLAYERS
+        self._key ^= self._piece_keys[piece][index]
+        self._material[piece.upper() != piece] -= self._values[piece]
+        return piece
+
+    def _add_to_hand(self, player, abbrev, number):
+        hand = self._hands[player]
+        old_number = hand[abbrev]
+        hand[abbrev] += number
+        if hand[abbrev] == 0:
+            del hand[abbrev]
+
+        self._key ^= self._hand_key(player, abbrev, old_number) ^ \
+            self._hand_key(player, abbrev, old_number + number)
+        self._material[player] += self._values[abbrev] * number
+
+    @classmethod
+    def _hand_key(cls, player, abbrev, number):
+        if number == 0:
+            return 0  # so that empty hands do not matter
+
+        key = cls._ZOBRIST_HANDS.get((player, abbrev, number))
+        if key is None:
+            key = cls._ZOBRIST_HANDS[(player, abbrev, number)] = \
+                random.Random('{} {} {}'.format(player, abbrev, number)) \
+                .getrandbits(cls.ZOBRIST_BITS)
+        return key
+
+    def _update_attacks_from(self, index, piece, number):
+        attacks = self._attacks[piece.upper() != piece]
+        board = self._board
+        leaps, rays, _ = self._move_tables[piece][index]
+
+        for dest_index in leaps:
+            attacks[dest_index] += number
+
+        for ray in rays:
+            for dest_index in ray:
+                attacks[dest_index] += number
+                if board[dest_index] is not None:
+                    break  # we cannot go beyond it
+
+    def _update_lines_through(self, index, number):
+        bitboards = self._bitboards
+        occupied = bitboards.occupied
+
+        for player, coordinate, delta, rays in self._rider_lines:
+            blockers = rays[index] & occupied
+            if not blockers:
+                continue  # reached the edge of the board
+
+            rider_index = Bitboards.nearest(blockers, -delta)
+            if not (bitboards.player(player) >> rider_index) & 1:
+                continue  # found one of his pieces
+
+            abbrev = self._board[rider_index].upper()
+            range = self._pieces.directions(abbrev).get(coordinate, 1)
+            distance = (index - rider_index) // delta
+            if range == 0:
+                remaining = 0  # i.e. unlimited
+            elif range > distance:
+                remaining = range - distance
+            else:
+                continue  # cannot go beyond index (or wrong orientation)
+
+            attacks = self._attacks[player]
+            for dest_index in Bitboards.indices(
+                    bitboards.attacks(index, delta, remaining)):
+                attacks[dest_index] += number
+
+    def _delta(self, coordinate, player):
+        # index offset of a single step along coordinate, from the point of
+        #  view of player
+        dx, dy = coordinate
+        delta = dy * self._stride + dx
+        return -delta if player == 0 else delta
+
     def _parse_rank(self, sfen_rank, rank, num_files_known):
         tokens = re.findall(r'\+?' + self.UNPROMOTED_PIECE_REGEX + r'|\d+',
                             sfen_rank)
@@ -120,10 +320,10 @@ class Position:
         player = 0 if abbrev == piece else 1
 
         if self._pieces.is_royal(abbrev):
-            if self._royal_squares[player]:
+            if self._royal_squares[player] is not None:
                 raise ValueError('Too many royal pieces for {}'
                                  .format(self.player_name(player)))
-            self._royal_squares[player] = file, rank
+            self._royal_squares[player] = self._index((file, rank))
 
         max_per_file = self._pieces.max_per_file(abbrev)
         if max_per_file:
@@ -141,7 +341,11 @@ class Position:
             raise ValueError('Promotion zone too small for {}'.format(abbrev))
 
         self._remember_piece(abbrev)
-        self._board[(file, rank)] = piece
+
+        # attack maps are built once the board is known
+        index = self._index((file, rank))
+        self._board[index] = piece
+        self._bitboards.toggle(index, piece, player)
 
     def _parse_hands(self, sfen_hands):
         for number, piece in re.findall('([1-9][0-9]*)?(' +
@@ -160,12 +364,39 @@ class Position:
             self._hands[player][abbrev] += number
 
     def _remember_piece(self, abbrev):
-        self._all_coordinates.update(self._pieces.directions(abbrev).keys())
+        self._remember_directions(abbrev)
+        if not self._pieces.is_promoted(abbrev) and \
+           self._pieces.can_promote(abbrev):
+            # the piece may promote later on
+            self._remember_directions(self._pieces.promoted(abbrev))
+
         if not self._pieces.is_royal(abbrev):
             if self._pieces.is_promoted(abbrev):
+                # the piece is demoted once captured
                 abbrev = self._pieces.unpromoted(abbrev)
+                self._remember_directions(abbrev)
             self._droppable_pieces.add(abbrev)
 
+    def _remember_directions(self, abbrev):
+        self._abbrevs.add(abbrev)
+
+        for coordinate, piece_range in self._pieces.directions(abbrev).items():
+            if coordinate not in self._all_coordinates:
+                self._all_coordinates.add(coordinate)
+                for player in range(self.NUM_PLAYERS):
+                    delta = -self._delta(coordinate, 1 - player)
+                    self._check_deltas[player].append(
+                        (coordinate, delta,
+                         self._bitboards.full_rays(delta)))
+
+            if piece_range != 1 and coordinate not in self._rider_coordinates:
+                self._rider_coordinates.add(coordinate)
+                for player in range(self.NUM_PLAYERS):
+                    delta = self._delta(coordinate, player)
+                    self._rider_lines.append(
+                        (player, coordinate, delta,
+                         self._bitboards.full_rays(-delta)))
+
     def _update_droppable_pieces(self):
         result = []
 
@@ -181,129 +412,778 @@ class Position:
 
         self._droppable_pieces = result
 
+        # the following data structure is indexed by [abbrev] and holds the
+        #  drop id of packed moves, see Move
+        self._drop_ids = {abbrev: drop_id for drop_id, abbrev
+                          in enumerate(self._droppable_pieces, 1)}
+
+        # the following data structure is indexed by [player][abbrev] and
+        #  holds the mask of ranks where the piece can be dropped
+        self._drop_ranks = [{} for player in range(self.NUM_PLAYERS)]
+        for player in range(self.NUM_PLAYERS):
+            for abbrev in self._droppable_pieces:
+                self._drop_ranks[player][abbrev] = 0
+                for rank in range(1, self._num_ranks+1):
+                    if self._is_piece_allowed_on_rank(abbrev, player, rank):
+                        self._drop_ranks[player][abbrev] |= \
+                            self._bitboards.rank(rank)
+
+    def _build_move_tables(self):
+        # the following data structure is indexed by [piece][index] and holds
+        #  (leaps, rays, overlap) where leaps lists destinations of single
+        #  steps, rays lists destinations of repeated steps ordered by distance
+        #  and overlap tells whether some destinations appear twice (e.g. fbRD)
+        self._move_tables = self._MOVE_TABLES.setdefault(
+                (self._pieces, self._num_files, self._num_ranks), {})
+
+        for abbrev in self._abbrevs:
+            for player in range(self.NUM_PLAYERS):
+                piece = abbrev if player == 0 else abbrev.lower()
+                if piece not in self._move_tables:
+                    self._move_tables[piece] = [
+                        self._build_move_table(abbrev, player, index)
+                        if self._squares[index] else None
+                        for index in range(len(self._board))]
+
+    def _build_move_table(self, abbrev, player, index):
+        leaps = []
+        rays = []
+
+        for coordinate, range in self._pieces.directions(abbrev).items():
+            delta = self._delta(coordinate, player)
+
+            ray = []
+            dest_index = index + delta
+            while self._board[dest_index] is not self.OFF_BOARD:
+                ray.append(dest_index)
+                if len(ray) == range:
+                    break
+                dest_index += delta
+
+            if range == 1:
+                leaps += ray
+            elif ray:
+                rays.append(tuple(ray))
+
+        num_destinations = len(leaps) + sum(len(ray) for ray in rays)
+        overlap = len(set(leaps).union(*rays)) < num_destinations
+
+        return tuple(leaps), tuple(rays), overlap
+
+    def _build_attack_maps(self):
+        # the following data structure is indexed by [player][index] and
+        #  counts the lines (i.e. piece and direction) on which his pieces
+        #  attack each square, whether occupied or not
+        self._attacks = [[0] * len(self._board)
+                         for count in range(self.NUM_PLAYERS)]
+
+        for index in self._board_indices:
+            piece = self._board[index]
+            if piece:
+                self._update_attacks_from(index, piece, 1)
+
+    def _build_zobrist_keys(self):
+        # the following data structure is indexed by [piece][index]
+        self._piece_keys = {}
+        for abbrev in self._abbrevs:
+            for player in range(self.NUM_PLAYERS):
+                piece = abbrev if player == 0 else abbrev.lower()
+                keys = self._ZOBRIST_PIECES.get((piece, len(self._board)))
+                if keys is None:
+                    generator = random.Random(piece)
+                    keys = self._ZOBRIST_PIECES[(piece, len(self._board))] = [
+                        generator.getrandbits(self.ZOBRIST_BITS)
+                        for index in range(len(self._board))]
+                self._piece_keys[piece] = keys
+
+        self._key = 0
+        for index in self._board_indices:
+            piece = self._board[index]
+            if piece:
+                self._key ^= self._piece_keys[piece][index]
+
+        for player in range(self.NUM_PLAYERS):
+            for abbrev, number in self._hands[player].items():
+                self._key ^= self._hand_key(player, abbrev, number)
+
+        if self._player_to_move == 1:
+            self._key ^= self._ZOBRIST_PLAYER
+
+    def _build_material(self):
+        # the following data structure is indexed by [piece]
+        self._values = {}
+        for abbrev in self._abbrevs:
+            value = 0 if self._pieces.is_royal(abbrev) else \
+                self._pieces.value(abbrev)
+            self._values[abbrev] = self._values[abbrev.lower()] = value
+
+        self._material = [0] * self.NUM_PLAYERS
+        for index in self._board_indices:
+            piece = self._board[index]
+            if piece:
+                self._material[piece.upper() != piece] += self._values[piece]
+
+        for player in range(self.NUM_PLAYERS):
+            for abbrev, number in self._hands[player].items():
+                self._material[player] += self._values[abbrev] * number
+
     def _verify_opponent_not_in_check(self):
         opponent = self.NUM_PLAYERS - self._player_to_move - 1
         piece = self._piece_giving_check_to(opponent)
         if piece:
             raise ValueError('Opponent already in check by {}'.format(piece))
 
-    def _piece_giving_check_to(self, player, royal_square=None):
-        if not royal_square:  # argument not provided
-            royal_square = self._royal_squares[player]
-        if not royal_square:  # player has no royal piece
+    def _piece_giving_check_to(self, player, royal_index=None, occupied=None):
+        if royal_index is None:  # argument not provided
+            royal_index = self._royal_squares[player]
+        if royal_index is None:  # player has no royal piece
             return
 
-        for coordinate in self._all_coordinates:
-            file, rank = royal_square
-            dx, dy = coordinate
-            if player == 1:
-                dx, dy = -dx, -dy
-
-            range = 0
-            while True:
-                file -= dx
-                rank -= dy
-                if file < 1 or file > self._num_files or \
-                   rank < 1 or rank > self._num_ranks:
-                    break  # outside the board
-
-                range += 1
-
-                piece = self._board.get((file, rank))
-                if not piece:
-                    continue  # empty square
-
-                abbrev = piece.upper()
-                piece_player = 0 if abbrev == piece else 1
-                if piece_player == player:
-                    break  # found one of his pieces
-
-                piece_directions = self._pieces.directions(abbrev)
-                if coordinate not in piece_directions:
-                    break  # cannot check him (wrong orientation)
-
-                piece_range = piece_directions[coordinate]
-                if piece_range == 0 or piece_range >= range:
-                    # my piece has enough range to check him
-                    return abbrev
-                else:
-                    break
+        opponent = self.NUM_PLAYERS - player - 1
+        for index in self._attackers(royal_index, opponent, occupied):
+            return self._board[index].upper()
+
+    def _attackers(self, index, player, occupied=None):
+        if occupied is None:  # argument not provided
+            occupied = self._bitboards.occupied
+
+        for coordinate, delta, rays in self._check_deltas[1 - player]:
+            # walk backwards from the square to the closest piece
+            blockers = rays[index] & occupied
+            if not blockers:
+                continue  # reached the edge of the board
+
+            if delta > 0:
+                attacker_index = (blockers & -blockers).bit_length() - 1
+            else:
+                attacker_index = blockers.bit_length() - 1
+            piece = self._board[attacker_index]
+            abbrev = piece.upper()
+            piece_player = 0 if abbrev == piece else 1
+            if piece_player != player:
+                continue  # found one of his pieces
+
+            piece_directions = self._pieces.directions(abbrev)
+            if coordinate not in piece_directions:
+                continue  # cannot attack (wrong orientation)
+
+            range = (attacker_index - index) // delta
+            piece_range = piece_directions[coordinate]
+            if piece_range == 0 or piece_range >= range:
+                # my piece has enough range to attack
+                yield attacker_index
+
+    def _checks_and_pins(self, player):
+        # returns (checkers, blocks, pins) for player, where checkers is a
+        #  mask of pieces giving check to him, blocks a mask of squares where
+        #  his non-royal pieces must go to parry all checks (or None if not in
+        #  check) and pins a dict indexed by [index] holding the mask of
+        #  squares his pinned piece can go to without exposing his royal piece
+        result = self._safety[player]
+        if result:
+            return result
+
+        checkers = 0
+        blocks = None
+        pins = {}
+
+        royal_index = self._royal_squares[player]
+        occupied = self._bitboards.occupied
+        for coordinate, delta, rays in self._check_deltas[player]:
+            blockers = rays[royal_index] & occupied
+            if not blockers:
+                continue  # reached the edge of the board
+
+            index = Bitboards.nearest(blockers, delta)
+            if (self._bitboards.player(player) >> index) & 1:
+                index, pinned_index = \
+                    Bitboards.nearest(blockers & ~(1 << index), delta), index
+                if index < 0:
+                    continue  # no piece behind his piece
+            else:
+                pinned_index = None
+
+            line = self._line_of_fire(player, royal_index, coordinate, delta,
+                                      index)
+            if not line:
+                continue  # my piece cannot reach him
+            elif pinned_index is not None:
+                pins[pinned_index] = pins.get(pinned_index, line) & line
+            else:
+                checkers |= 1 << index
+                blocks = line if blocks is None else blocks & line
+
+        result = self._safety[player] = checkers, blocks, pins
+        return result
+
+    def _line_of_fire(self, player, royal_index, coordinate, delta, index):
+        # returns squares from his royal piece (excluded) to my piece on index
+        #  (included) if it could check him in an otherwise empty line
+        piece = self._board[index]
+        abbrev = piece.upper()
+        piece_player = 0 if abbrev == piece else 1
+        if piece_player == player:
+            return 0  # found one of his pieces
+
+        piece_range = self._pieces.directions(abbrev).get(coordinate)
+        if piece_range is None:
+            return 0  # cannot check him (wrong orientation)
+
+        range = (index - royal_index) // delta
+        if piece_range != 0 and piece_range < range:
+            return 0  # not enough range
+
+        return self._bitboards.ray(royal_index, delta, range)
 
     def status(self):
-        try:
-            next(self._legal_moves_and_drops())
-            if self._checking_piece:
-                return 'check'
-        except StopIteration:
-            return 'checkmate' if self._checking_piece else 'stalemate'
-        return ''
+        turn_over = not hasattr(self, '_movement')  # see choose_promotion
+        if turn_over:
+            cached = self._statuses.get(self._key)
+            if cached:
+                return cached[0]
+
+        if next(self._legal_moves_and_drops(), None) is None:
+            result = 'checkmate' if self._checking_piece else 'stalemate'
+        else:
+            result = 'check' if self._checking_piece else ''
 
-    def _legal_moves_and_drops(self):
-        yield from self._legal_moves(self._player_to_move)
+        if not turn_over:
+            return result  # i.e. not remembered until the turn is over
 
-        for abbrev in self._hands[self._player_to_move]:
-            yield from self.legal_drops_with_piece(abbrev)
+        if len(self._statuses) >= self.STATUSES_CACHE_SIZE:
+            self._statuses.clear()
+        self._statuses[self._key] = result, self._checking_piece
+        return result
 
-    def _legal_moves(self, player):
-        for square in list(self._board):
-            piece = self._board[square]
+    def legal_moves(self):
+        # i.e. every legal move and drop of the player to move, packed (see
+        #  Move), with one move per promotion choice
+        player = self._player_to_move
+        if self._is_in_check(player):
+            return self._packed_evasions(player)
+
+        result = []
+        append = result.append
+
+        for index in Bitboards.indices(self._bitboards.player(player)):
+            dest_indices = self._legal_moves_from_index(index, player)
 
+            abbrev = self._board[index].upper()
+            if self._pieces.is_promoted(abbrev) or \
+               not self._pieces.can_promote(abbrev):
+                origin = index << Move.ORIGIN_SHIFT
+                for dest_index in dest_indices:
+                    append(origin | dest_index)
+                continue
+
+            for dest_index in dest_indices:
+                for promotes in self._promotions(index, dest_index):
+                    append(Move.pack(index, dest_index, promotes))
+
+        for abbrev, dest_index in self._legal_drops():
+            append(self._drop_ids[abbrev] << Move.DROP_SHIFT | dest_index)
+
+        return result
+
+    def random_move(self, generator):
+        # returns a legal move or drop (packed) of the player to move, or None
+        #  if he has none, picked with generator (e.g. a random.Random) among
+        #  those of a piece on board or kind in hand picked first, which is
+        #  much faster than picking one of legal_moves()
+        player = self._player_to_move
+        if self._is_in_check(player):
+            moves = self._packed_evasions(player)
+            return generator.choice(moves) if moves else None
+
+        sources = list(Bitboards.indices(self._bitboards.player(player)))
+        sources += self._hands[player]
+        generator.shuffle(sources)
+        for source in sources:
+            if isinstance(source, str):  # i.e. in hand
+                dest_indices = list(self._legal_drops_with_piece(source))
+                if dest_indices:
+                    return Move.pack_drop(self._drop_ids[source],
+                                          generator.choice(dest_indices))
+            else:
+                dest_indices = list(self._legal_moves_from_index(source,
+                                                                 player))
+                if dest_indices:
+                    dest_index = generator.choice(dest_indices)
+                    return Move.pack(source, dest_index, generator.choice(
+                        self._promotions(source, dest_index)))
+        return None
+
+    def staged_moves(self):
+        # same moves and drops as legal_moves(), but generated lazily stage
+        #  by stage: captures (most valuable victims first), other promoting
+        #  moves, other moves, then drops
+        player = self._player_to_move
+        yield from self._captures(player)
+
+        for promotes in True, False:  # i.e. promoting moves, then quiet moves
+            for index in Bitboards.indices(self._bitboards.player(player)):
+                abbrev = self._board[index].upper()
+                if promotes and (self._pieces.is_promoted(abbrev) or
+                                 not self._pieces.can_promote(abbrev)):
+                    continue  # cannot promote
+
+                empty = self._bitboards.empty
+                for dest_index in self._legal_moves_from_index(index, player):
+                    if (empty >> dest_index) & 1 and \
+                       promotes in self._promotions(index, dest_index):
+                        yield Move.pack(index, dest_index, promotes)
+
+        for abbrev, dest_index in self._legal_drops():
+            yield Move.pack_drop(self._drop_ids[abbrev], dest_index)
+
+    def captures(self):
+        # i.e. the captures which staged_moves() yields first
+        return self._captures(self._player_to_move)
+
+    def _captures(self, player):
+        opponent = self.NUM_PLAYERS - player - 1
+        value = self._pieces.value
+        victims = sorted(Bitboards.indices(self._bitboards.player(opponent)),
+                         key=lambda index: -value(self._board[index].upper()))
+
+        for dest_index in victims:
+            # least valuable attackers first, each one once even if it can
+            #  capture in several directions
+            attackers = sorted(set(self._attackers(dest_index, player)),
+                               key=lambda index:
+                               value(self._board[index].upper()))
+            for index in attackers:
+                if self._is_legal_move(index, dest_index, player):
+                    for promotes in sorted(
+                            self._promotions(index, dest_index),
+                            reverse=True):
+                        yield Move.pack(index, dest_index, promotes)
+
+    def checking_moves(self):
+        # i.e. legal moves and drops (packed) of the player to move which
+        #  give check, directly or by discovering one of his riders
+        player = self._player_to_move
+        opponent = self.NUM_PLAYERS - player - 1
+        if self._royal_squares[opponent] is None:
+            return  # opponent has no royal piece
+
+        occupied = self._bitboards.occupied
+        discoverers = self._discoverers(player)
+        for index, dest_index in self._checking_candidates(player,
+                                                           discoverers):
+            if not self._is_legal_move(index, dest_index, player):
+                continue
+
+            abbrev = self._board[index].upper()
+            for promotes in self._promotions(index, dest_index):
+                piece = self._board[index]
+                if promotes:
+                    piece = self._pieces.promoted(abbrev) if player == 0 else \
+                        self._pieces.promoted(abbrev).lower()
+
+                line = discoverers.get(index)
+                if (line is not None and not (line >> dest_index) & 1) or \
+                   (self._check_squares(piece, occupied & ~(1 << index))
+                        >> dest_index) & 1:
+                    yield Move.pack(index, dest_index, promotes)
+
+        yield from self._checking_drops(player)
+
+    def see(self, move):
+        # Static exchange evaluation, i.e. material won by the player to move
+        #  (see Pieces.value) on the destination of the legal move or drop
+        #  (in any form accepted by push()), if both players then keep on
+        #  capturing there with their least valuable piece as long as it pays
+        #  off. Pins and promotions after the first move are ignored.
+        if isinstance(move, Move):
+            move = move.value
+        elif not isinstance(move, int):
+            move = self.pack_move(move)
+
+        dest_index = move & Move.INDEX_MASK
+        drop_id = move >> Move.DROP_SHIFT
+        occupied = self._bitboards.occupied | 1 << dest_index
+        if drop_id:
+            abbrev = self._droppable_pieces[drop_id - 1]
+        else:
+            index = (move >> Move.ORIGIN_SHIFT) & Move.INDEX_MASK
+            occupied &= ~(1 << index)
+            abbrev = self._board[index].upper()
+            if move & Move.PROMOTION_FLAG:
+                abbrev = self._pieces.promoted(abbrev)
+
+        value = self._pieces.value
+        captured = self._board[dest_index]
+        gains = [value(captured.upper()) if captured else 0]
+        on_square = value(abbrev)  # i.e. value of the piece to be captured
+
+        player = self.NUM_PLAYERS - self._player_to_move - 1
+        while True:
+            attackers = set(self._attackers(dest_index, player, occupied))
+            if not attackers:
+                break
+
+            index = min(attackers,
+                        key=lambda index: value(self._board[index].upper()))
+            occupied &= ~(1 << index)
+            opponent = self.NUM_PLAYERS - player - 1
+            if index == self._royal_squares[player] and \
+               next(self._attackers(dest_index, opponent, occupied), None) \
+               is not None:
+                break  # his royal piece cannot capture a protected piece
+
+            gains.append(on_square - gains[-1])
+            on_square = value(self._board[index].upper())
+            player = opponent
+
+        # each player may stop capturing when it no longer pays off
+        for depth in reversed(range(1, len(gains))):
+            gains[depth - 1] = -max(-gains[depth - 1], gains[depth])
+        return gains[0]
+
+    def _checking_candidates(self, player, discoverers):
+        # returns a set of (index, dest_index) including all moves of player
+        #  giving check, see checking_moves
+        mine = self._bitboards.player(player)
+        targets = 0
+        promotables = []
+        for piece in self._move_tables:
+            if (piece.upper() == piece) != (player == 0) or \
+               not self._bitboards.piece(piece):
+                continue  # none of my pieces of this kind
+
+            targets |= self._check_squares(piece, self._bitboards.occupied)
             abbrev = piece.upper()
-            piece_player = 0 if abbrev == piece else 1
-            if piece_player != player:
+            if not self._pieces.is_promoted(abbrev) and \
+               self._pieces.can_promote(abbrev):
+                promoted = self._pieces.promoted(abbrev)
+                if player == 1:
+                    promoted = promoted.lower()
+                targets |= self._check_squares(promoted,
+                                               self._bitboards.occupied)
+                promotables += Bitboards.indices(
+                    self._bitboards.piece(piece) &
+                    self._check_squares(promoted, 0))  # in line with him
+
+        result = set()
+        for dest_index in Bitboards.indices(targets & ~mine):
+            for index in self._attackers(dest_index, player):
+                result.add((index, dest_index))
+
+        # a piece moving away may discover a rider, or itself once promoted
+        #  (as it no longer blocks its new line)
+        for index in list(discoverers) + promotables:
+            for dest_index in self._pseudo_legal_moves_from_index(index,
+                                                                  player):
+                result.add((index, dest_index))
+
+        return result
+
+    def _check_squares(self, piece, occupied):
+        # returns the mask of squares from which piece would attack the royal
+        #  piece of its opponent, according to occupied
+        player = 0 if piece.upper() == piece else 1
+        royal_index = self._royal_squares[self.NUM_PLAYERS - player - 1]
+
+        result = 0
+        for coordinate, piece_range in \
+                self._pieces.directions(piece.upper()).items():
+            delta = self._delta(coordinate, player)
+            result |= self._bitboards.attacks(royal_index, -delta,
+                                              piece_range, occupied)
+        return result
+
+    def _discoverers(self, player):
+        # returns a dict indexed by [index] holding the mask of the line
+        #  between his royal piece and my rider behind my piece on index
+        opponent = self.NUM_PLAYERS - player - 1
+        royal_index = self._royal_squares[opponent]
+        occupied = self._bitboards.occupied
+        mine = self._bitboards.player(player)
+
+        result = {}
+        for coordinate, delta, rays in self._check_deltas[opponent]:
+            blockers = rays[royal_index] & occupied
+            if not blockers:
+                continue  # reached the edge of the board
+
+            index = Bitboards.nearest(blockers, delta)
+            if not (mine >> index) & 1:
                 continue  # found one of his pieces
 
-            yield from self.legal_moves_from_square(square, player)
+            rider_index = Bitboards.nearest(blockers & ~(1 << index), delta)
+            if rider_index < 0:
+                continue  # no piece behind my piece
+
+            line = self._line_of_fire(opponent, royal_index, coordinate,
+                                      delta, rider_index)
+            if line:
+                result[index] = result.get(index, line) & line
+        return result
+
+    def _checking_drops(self, player):
+        occupied = self._bitboards.occupied
+        targets = self._drop_targets()
+        for abbrev in self._hands[player]:
+            piece = abbrev if player == 0 else abbrev.lower()
+            dest_indices = targets & self._drop_squares(abbrev) & \
+                self._check_squares(piece, occupied)
+            for dest_index in Bitboards.indices(dest_indices):
+                if not self._pieces.no_drop_mate(abbrev) or \
+                   not self._is_drop_mate(abbrev, dest_index):
+                    yield Move.pack_drop(self._drop_ids[abbrev], dest_index)
+
+    def _packed_evasions(self, player):
+        result = [Move.pack(index, dest_index, promotes)
+                  for index, dest_index in self._evasion_moves(player)
+                  for promotes in self._promotions(index, dest_index)]
+        result += [Move.pack_drop(self._drop_ids[abbrev], dest_index)
+                   for abbrev, dest_index in self._legal_drops()]
+        return result
+
+    def _legal_moves_and_drops(self):
+        yield from self._legal_moves(self._player_to_move)
+        yield from self._legal_drops()
+
+    def _legal_moves(self, player):
+        if self._is_in_check(player):
+            yield from self._evasion_moves(player)
+            return
+
+        for index in Bitboards.indices(self._bitboards.player(player)):
+            for dest_index in self._legal_moves_from_index(index, player):
+                yield index, dest_index
+
+    def _evasion_moves(self, player):
+        # i.e. legal moves of player, who is in check: his royal piece runs
+        #  away, or another piece captures the single checker or interposes
+        royal_index = self._royal_squares[player]
+        for dest_index in self._pseudo_legal_moves_from_index(royal_index,
+                                                              player):
+            if self._is_legal_move(royal_index, dest_index, player):
+                yield royal_index, dest_index
+
+        _, blocks, pins = self._checks_and_pins(player)
+        for dest_index in Bitboards.indices(blocks):  # none if double check
+            # a piece may reach the same square in several directions
+            for index in set(self._attackers(dest_index, player)):
+                if index == royal_index:
+                    continue  # already handled above
+
+                pin = pins.get(index)
+                if pin is None or (pin >> dest_index) & 1:
+                    yield index, dest_index
 
     def move(self, square, dest_square, promotes=False):
-        if dest_square not in self.legal_moves_from_square(square):
+        self._verify_square(square, self._player_to_move)
+        if not self._is_on_board(dest_square):
             raise ValueError('Illegal move')
 
-        possible_promotions = self.promotions(square, dest_square)
+        index, dest_index = self._index(square), self._index(dest_square)
+        if not self._is_legal_movement(index, dest_index):
+            raise ValueError('Illegal move')
+
+        possible_promotions = self._promotions(index, dest_index)
         if promotes is None:
             if len(possible_promotions) < 2:
                 raise ValueError('Undefined promotion')
-        elif promotes not in self.promotions(square, dest_square):
+        elif promotes not in possible_promotions:
             raise ValueError('Illegal promotion')
 
+        record = self._make_move(index, dest_index, promotes)
+
+        # end turn unless promotion is deferred
+        if promotes is None:
+            self._movement = record
+        else:
+            self._undo_stack.append(record)
+            self._end_turn()
+
+    def apply_move(self, square, dest_square, promotes=False):
+        # same as move() for a move known to be legal, e.g. when replaying a
+        #  game, hence without any check
+        self._undo_stack.append(self._make_move(
+            self._index(square), self._index(dest_square), promotes))
+        self._end_turn()
+
+    def is_legal(self, move):
+        # i.e. whether the move or drop (in any form accepted by push()) is
+        #  legal for the player to move, without generating other moves
+        if isinstance(move, Move):
+            move = move.value
+        elif not isinstance(move, int):
+            if isinstance(move[0], str):
+                origin_known = move[0] in self._drop_ids
+            else:
+                origin_known = self._is_on_board(move[0])
+            if not origin_known or not self._is_on_board(move[1]):
+                return False
+            move = self.pack_move(move)
+
+        dest_index = move & Move.INDEX_MASK
+        drop_id = move >> Move.DROP_SHIFT
+        if drop_id:
+            return drop_id <= len(self._droppable_pieces) and \
+                self._is_legal_drop(self._droppable_pieces[drop_id - 1],
+                                    dest_index)
+
+        index = (move >> Move.ORIGIN_SHIFT) & Move.INDEX_MASK
+        promotes = bool(move & Move.PROMOTION_FLAG)
+        return self._is_legal_movement(index, dest_index) and \
+            promotes in self._promotions(index, dest_index)
+
+    def _is_legal_movement(self, index, dest_index):
+        # i.e. whether the piece on index can legally go to dest_index,
+        #  ignoring promotion
         player = self._player_to_move
+        mine = self._bitboards.player(player)
+        if not (mine >> index) & 1 or (mine >> dest_index) & 1 or \
+           not (self._bitboards.board >> dest_index) & 1:
+            return False  # not my piece, or not a square I can go to
+
+        return index in self._attackers(dest_index, player) and \
+            self._is_legal_move(index, dest_index, player)
+
+    def push(self, move):
+        # No legality check is performed, we consider that the client pushes
+        #  (square, dest_square, promotes) with squares returned by
+        #  legal_moves_from_square() and promotes by promotions(), or
+        #  (abbrev, dest_square) with dest_square returned by
+        #  legal_drops_with_piece(), or the same packed by pack_move()
+        if isinstance(move, Move):
+            move = move.value
+        if isinstance(move, int):
+            record = self._make_packed_move(move)
+        elif isinstance(move[0], str):
+            abbrev, dest_square = move
+            record = self._make_drop(abbrev, self._index(dest_square))
+        else:
+            square, dest_square, promotes = move
+            record = self._make_move(self._index(square),
+                                     self._index(dest_square), promotes)
+
+        self._undo_stack.append(record)
+        self._end_turn()
+
+    def _make_packed_move(self, move):
+        dest_index = move & Move.INDEX_MASK
+        drop_id = move >> Move.DROP_SHIFT
+        if drop_id:
+            return self._make_drop(self._droppable_pieces[drop_id - 1],
+                                   dest_index)
+        else:
+            return self._make_move(
+                (move >> Move.ORIGIN_SHIFT) & Move.INDEX_MASK, dest_index,
+                bool(move & Move.PROMOTION_FLAG))
+
+    def pack_move(self, move):
+        # i.e. the int standing for a (square, dest_square, promotes) or
+        #  (abbrev, dest_square) tuple, see Move
+        if isinstance(move[0], str):
+            abbrev, dest_square = move
+            return Move.pack_drop(self._drop_ids[abbrev],
+                                  self._index(dest_square))
+        else:
+            square, dest_square, promotes = move
+            return Move.pack(self._index(square), self._index(dest_square),
+                             promotes)
+
+    def unpack_move(self, move):
+        dest_square = self._squares[move & Move.INDEX_MASK]
+        drop_id = move >> Move.DROP_SHIFT
+        if drop_id:
+            return self._droppable_pieces[drop_id - 1], dest_square
+        else:
+            return (self._squares[(move >> Move.ORIGIN_SHIFT)
+                                  & Move.INDEX_MASK],
+                    dest_square, bool(move & Move.PROMOTION_FLAG))
+
+    def pop(self):
+        if not self._undo_stack:
+            raise ValueError('No move to undo')
+
+        index, dest_index, piece, captured_piece, hand_abbrev, \
+            royal_index, checking_piece, file_updates = self._undo_stack.pop()
+
+        self._player_to_move = self.NUM_PLAYERS - self._player_to_move - 1
+        self._key ^= self._ZOBRIST_PLAYER
+        player = self._player_to_move
+
+        # revert the move or drop
+        moved_piece = self._remove(dest_index)
+        if index is None:
+            self._add_to_hand(player, hand_abbrev, 1)
+            move = hand_abbrev, self._squares[dest_index]
+        else:
+            self._put(index, piece)
+            if captured_piece:
+                self._put(dest_index, captured_piece)
+                self._add_to_hand(player, hand_abbrev, -1)
+            move = (self._squares[index], self._squares[dest_index],
+                    moved_piece != piece)
+
+        # revert statistics
+        for file_player, abbrev, file, number in file_updates:
+            self._num_per_file[file_player][abbrev][file] -= number
+        self._royal_squares[player] = royal_index
+        self._checking_piece = checking_piece
+
+        return move
+
+    def _make_move(self, index, dest_index, promotes):
+        player = self._player_to_move
+        royal_index = self._royal_squares[player]
+        file_updates = []
 
         # perform the move
-        piece = self._board.pop(square)
-        captured_piece = self._board.get(dest_square)
-        self._board[dest_square] = piece
+        piece = self._remove(index)
+        captured_piece = self._board[dest_index]
+        if captured_piece:
+            self._remove(dest_index)
+        self._put(dest_index, piece)
         if promotes:
-            self._promotes(square, dest_square)
+            file_updates += self._promotes(index, dest_index)
 
         # captured piece goes in hand
+        captured_abbrev = None
         if captured_piece:
             captured_abbrev = captured_piece.upper()
 
             captured_max_per_file = self._pieces.max_per_file(captured_abbrev)
             if captured_max_per_file:
-                file, _ = dest_square
+                file = self._files[dest_index]
                 opponent = self.NUM_PLAYERS - player - 1
-                self._num_per_file[opponent][captured_abbrev][file] -= 1
+                file_updates.append(self._update_num_per_file(
+                    opponent, captured_abbrev, file, -1))
 
             if self._pieces.is_promoted(captured_abbrev):
                 captured_abbrev = self._pieces.unpromoted(captured_abbrev)
-            self._hands[player][captured_abbrev] += 1
+            self._add_to_hand(player, captured_abbrev, 1)
 
         # update statistics
-        if self._royal_squares[player] == square:
-            self._royal_squares[player] = dest_square
+        if royal_index == index:
+            self._royal_squares[player] = dest_index
 
-        # end turn unless promotion is deferred
-        if promotes is None:
-            self._movement = [square, dest_square]
-        else:
-            self._end_turn()
+        # i.e. the undo record, with what pop() needs to revert the move
+        return (index, dest_index, piece, captured_piece, captured_abbrev,
+                royal_index, self._checking_piece, tuple(file_updates))
+
+    def _update_num_per_file(self, player, abbrev, file, number):
+        self._num_per_file[player][abbrev][file] += number
+        return player, abbrev, file, number
 
     def legal_moves_from_square(self, square, player=None):
         if player is None:
             player = self._player_to_move
 
-        piece = self._board.get(square)
+        self._verify_square(square, player)
+
+        for dest_index in self._legal_moves_from_index(self._index(square),
+                                                       player):
+            yield self._squares[dest_index]
+
+    def _verify_square(self, square, player):
+        piece = self.get(square)
         if piece:
             abbrev = piece.upper()
             piece_player = 0 if abbrev == piece else 1
@@ -312,70 +1192,86 @@ class Position:
         else:
             raise ValueError('Square {} is empty'.format(square))
 
-        for dest_square in \
-                self._pseudo_legal_moves_from_square(square, player):
-            if self._is_legal_move(square, dest_square, player):
-                yield dest_square
+    def _legal_moves_from_index(self, index, player):
+        dest_indices = self._pseudo_legal_moves_from_index(index, player)
 
-    def _pseudo_legal_moves_from_square(self, square, player):
-        abbrev = self._board[square].upper()
-        for coordinate, range in self._pieces.directions(abbrev).items():
-            dx, dy = coordinate
-            if player == 0:
-                dx, dy = -dx, -dy
-            dest_file, dest_rank = square
-
-            while True:
-                dest_file += dx
-                dest_rank += dy
-                if dest_file < 1 or dest_file > self._num_files or \
-                   dest_rank < 1 or dest_rank > self._num_ranks:
-                    break  # outside the board
-
-                piece = self._board.get((dest_file, dest_rank))
-                if piece:
-                    abbrev = piece.upper()
-                    piece_player = 0 if abbrev == piece else 1
-                    if piece_player == player:
-                        break  # found one of my pieces
-                    else:
-                        yield (dest_file, dest_rank)  # found one of his pieces
-                        break                         # we cannot go beyond it
-                else:
-                    yield (dest_file, dest_rank)  # found an empty square
-                    if range == 1:
-                        break
-                    range -= 1
-
-    def _is_legal_move(self, square, dest_square, player):
-        royal_square = self._royal_squares[player]
-        if not royal_square:  # player has no royal piece
+        royal_index = self._royal_squares[player]
+        if royal_index is None:  # player has no royal piece
+            yield from dest_indices
+        elif index == royal_index:
+            for dest_index in dest_indices:
+                if self._is_legal_move(index, dest_index, player):
+                    yield dest_index
+        else:
+            allowed = self._allowed_destinations(index, player)
+            if allowed is None:
+                yield from dest_indices  # most moves are legal anyway
+            else:
+                for dest_index in dest_indices:
+                    if (allowed >> dest_index) & 1:
+                        yield dest_index
+
+    def _allowed_destinations(self, index, player):
+        # returns the mask of squares where his non-royal piece on index can
+        #  go, or None if there is no restriction
+        _, blocks, pins = self._checks_and_pins(player)
+
+        pin = pins.get(index)
+        if pin is None:
+            return blocks
+        else:
+            return pin if blocks is None else blocks & pin
+
+    def _pseudo_legal_moves_from_index(self, index, player):
+        leaps, rays, overlap = self._move_tables[self._board[index]][index]
+        dest_indices = self._walk_move_table(leaps, rays, player)
+        return set(dest_indices) if overlap else dest_indices
+
+    def _walk_move_table(self, leaps, rays, player):
+        board = self._board
+        mine = self._bitboards.player(player)
+
+        for dest_index in leaps:
+            if not (mine >> dest_index) & 1:
+                yield dest_index  # found an empty square or one of his pieces
+
+        for ray in rays:
+            for dest_index in ray:
+                if board[dest_index] is None:
+                    yield dest_index  # found an empty square
+                    continue
+
+                if not (mine >> dest_index) & 1:
+                    yield dest_index  # found one of his pieces
+                break                 # we cannot go beyond it
+
+    def _is_legal_move(self, index, dest_index, player):
+        royal_index = self._royal_squares[player]
+        if royal_index is None:  # player has no royal piece
             return True
 
-        if square == royal_square:
-            royal_square = dest_square  # we have moved the royal piece
-
-        # perform the move
-        captured_piece = self._board.get(dest_square)
-        self._board[dest_square] = self._board.pop(square)
-
-        result = True
-        if self._piece_giving_check_to(player, royal_square):
-            result = False
-
-        # revert the move to restore the board to its initial state
-        self._board[square] = self._board.pop(dest_square)
-        if captured_piece:
-            self._board[dest_square] = captured_piece
+        if index == royal_index:
+            opponent = self.NUM_PLAYERS - player - 1
+            if self._attacks[opponent][dest_index]:
+                return False
+            elif not self._attacks[opponent][index]:
+                return True  # no line of his goes through our royal piece
 
-        assert (None not in self._board.values())
+            # we have moved the royal piece, which no longer blocks any line
+            occupied = self._bitboards.occupied & ~(1 << index)
+            return not self._piece_giving_check_to(player, dest_index,
+                                                   occupied)
 
-        return result
+        allowed = self._allowed_destinations(index, player)
+        return allowed is None or bool((allowed >> dest_index) & 1)
 
     def promotions(self, square, dest_square):
         # No (pseudo) legal check is performed, we consider that the client
         #  calls this on squares returned by legal_moves_from_square()
-        piece = self._board[square]
+        return self._promotions(self._index(square), self._index(dest_square))
+
+    def _promotions(self, index, dest_index):
+        piece = self._board[index]
         abbrev = piece.upper()
 
         if self._pieces.is_promoted(abbrev):
@@ -383,12 +1279,12 @@ class Position:
         elif not self._pieces.can_promote(abbrev):
             return [False]
 
-        _, dest_rank = dest_square
+        dest_rank = self._ranks[dest_index]
         if not self._is_piece_allowed_on_rank(abbrev, self._player_to_move,
                                               dest_rank):
             return [True]  # i.e. mandatory
-        elif (self._in_promotion_zone(square) or
-              self._in_promotion_zone(dest_square)):
+        elif (self._in_promotion_zone(index) or
+              self._in_promotion_zone(dest_index)):
             if self._should_promote(abbrev, dest_rank):
                 return [True, False]
             else:
@@ -435,109 +1331,188 @@ class Position:
         return result
 
     def choose_promotion(self, promotes):
+        record = self._movement
         if promotes:
-            self._promotes(*self._movement)
+            index, dest_index = record[:2]
+            file_updates = self._promotes(index, dest_index)
+            record = record[:-1] + (record[-1] + tuple(file_updates),)
         del self._movement
 
+        self._undo_stack.append(record)
         self._end_turn()
 
-    def _promotes(self, square, dest_square):
+    def _promotes(self, index, dest_index):
         player = self._player_to_move
 
-        piece = self._board.pop(dest_square)
-        self._board[dest_square] = self._pieces.promoted(piece)
+        piece = self._remove(dest_index)
+        self._put(dest_index, self._pieces.promoted(piece))
 
         # update statistics
         abbrev = piece.upper()
         max_per_file = self._pieces.max_per_file(abbrev)
         if max_per_file:
-            file, _ = square
-            self._num_per_file[player][abbrev][file] -= 1
+            file = self._files[index]
+            return [self._update_num_per_file(player, abbrev, file, -1)]
+        return []
 
     def drop(self, abbrev, dest_square):
-        if dest_square not in self.legal_drops_with_piece(abbrev):
+        if not self._hands[self._player_to_move].get(abbrev):
+            raise ValueError('Piece {} is not in hand'.format(abbrev))
+        if not self._is_on_board(dest_square) or \
+           not self._is_legal_drop(abbrev, self._index(dest_square)):
             raise ValueError('Illegal drop')
 
+        self.apply_drop(abbrev, dest_square)
+
+    def apply_drop(self, abbrev, dest_square):
+        # same as drop() for a drop known to be legal, hence without any check
+        self._undo_stack.append(self._make_drop(abbrev,
+                                                self._index(dest_square)))
+        self._end_turn()
+
+    def _is_legal_drop(self, abbrev, dest_index):
+        if not self._hands[self._player_to_move].get(abbrev):
+            return False
+
+        targets = self._drop_targets() & self._drop_squares(abbrev)
+        if not (targets >> dest_index) & 1:
+            return False
+        return not self._pieces.no_drop_mate(abbrev) or \
+            not self._is_drop_mate(abbrev, dest_index)
+
+    def _make_drop(self, abbrev, dest_index):
         player = self._player_to_move
+        piece = abbrev if player == 0 else abbrev.lower()
+        file_updates = []
 
         # perform the drop
-        self._board[dest_square] = abbrev if player == 0 else abbrev.lower()
-        self._hands[player][abbrev] -= 1
-        if self._hands[player][abbrev] == 0:
-            del self._hands[player][abbrev]
+        self._put(dest_index, piece)
+        self._add_to_hand(player, abbrev, -1)
 
         # update statistics
         max_per_file = self._pieces.max_per_file(abbrev)
         if max_per_file:
-            file, _ = dest_square
-            self._num_per_file[player][abbrev][file] += 1
+            file = self._files[dest_index]
+            file_updates.append(self._update_num_per_file(player, abbrev,
+                                                          file, 1))
 
-        self._end_turn()
+        return (None, dest_index, piece, None, abbrev,
+                self._royal_squares[player], self._checking_piece,
+                tuple(file_updates))
 
     def legal_drops_with_piece(self, abbrev):
         if not self._hands[self._player_to_move].get(abbrev):
             raise ValueError('Piece {} is not in hand'.format(abbrev))
 
-        for rank in range(1, self._num_ranks+1):
-            for file in range(1, self._num_files+1):
-                square = file, rank
-                if self._board.get(square):
-                    continue  # not empty
+        for dest_index in self._legal_drops_with_piece(abbrev):
+            yield self._squares[dest_index]
 
-                if self._is_pseudo_legal_drop(abbrev, square) and \
-                   self._is_legal_drop(abbrev, square):
-                    yield square
+    def _legal_drops(self):
+        # i.e. legal drops (abbrev, dest_index) of the player to move, with
+        #  target squares computed once for all pieces in hand
+        targets = self._drop_targets()
+        if not targets:
+            return
 
-    def _is_pseudo_legal_drop(self, abbrev, square):
-        file, rank = square
+        for abbrev in self._hands[self._player_to_move]:
+            for dest_index in self._legal_drops_with_piece(abbrev, targets):
+                yield abbrev, dest_index
+
+    def _legal_drops_with_piece(self, abbrev, targets=None):
+        if targets is None:  # argument not provided
+            targets = self._drop_targets()
+
+        dest_indices = Bitboards.indices(targets & self._drop_squares(abbrev))
+        if not self._pieces.no_drop_mate(abbrev):
+            yield from dest_indices
+            return
+
+        for dest_index in dest_indices:
+            if not self._is_drop_mate(abbrev, dest_index):
+                yield dest_index  # cannot checkmate opponent with drop
+
+    def _drop_targets(self):
+        # returns the mask of empty squares where a drop leaves the player to
+        #  move out of check: all of them unless he is currently in check,
+        #  since a drop cannot expose his royal piece
+        player = self._player_to_move
+        result = self._bitboards.empty
+        if self._is_in_check(player):
+            _, blocks, _ = self._checks_and_pins(player)
+            result &= blocks  # interposing between his royal piece and a rider
+        return result
+
+    def _drop_squares(self, abbrev):
+        # returns the mask of squares where the player to move could drop the
+        #  piece if they were empty
         player = self._player_to_move
+        result = self._drop_ranks[player][abbrev]
 
         max_per_file = self._pieces.max_per_file(abbrev)
-        if max_per_file and \
-           max_per_file == self._num_per_file[player][abbrev][file]:
-            return False  # Nifu and related restrictions
-
-        if not self._is_piece_allowed_on_rank(abbrev, player, rank):
-            return False  # rank restriction
+        if max_per_file:
+            for file, number in self._num_per_file[player][abbrev].items():
+                if number == max_per_file:
+                    result &= ~self._bitboards.file(file)  # Nifu and related
 
-        return True
+        return result
 
-    def _is_legal_drop(self, abbrev, dest_square):
+    def _is_drop_mate(self, abbrev, dest_index):
         player = self._player_to_move
+        piece = abbrev if player == 0 else abbrev.lower()
+        if not self._drop_gives_check(piece, dest_index):
+            return False
+
+        cache_key = self._key, piece, dest_index
+        result = self._drop_mates.get(cache_key)
+        if result is not None:
+            return result
 
         # perform the drop
-        self._board[dest_square] = abbrev if player == 0 else abbrev.lower()
+        self._put(dest_index, piece)
 
-        result = True
-        if self._piece_giving_check_to(player):
-            result = False  # currently in check and drop didn't block it
-        elif (self._pieces.no_drop_mate(abbrev) and
-              self._is_opponent_checkmated()):
-            result = False  # cannot checkmate opponent with drop
+        # his royal piece cannot run away, nor can he capture my piece (which
+        #  is not a rider, so that he cannot interpose any piece either)
+        opponent = self.NUM_PLAYERS - player - 1
+        result = next(self._evasion_moves(opponent), None) is None
 
         # revert the drop to restore the board to its initial state
-        del self._board[dest_square]
-
-        assert (None not in self._board.values())
+        self._remove(dest_index)
 
+        if len(self._drop_mates) >= self.DROP_MATES_CACHE_SIZE:
+            self._drop_mates.clear()
+        self._drop_mates[cache_key] = result
         return result
 
-    def _is_opponent_checkmated(self):
-        opponent = self.NUM_PLAYERS - self._player_to_move - 1
-        if not self._piece_giving_check_to(opponent):
+    def _drop_gives_check(self, piece, index):
+        opponent = 1 if piece.upper() == piece else 0
+        royal_index = self._royal_squares[opponent]
+        if royal_index is None:  # opponent has no royal piece
             return False
 
-        try:
-            next(self._legal_moves(opponent))
-            return False
-        except StopIteration:
-            return True
+        # no_drop_mate pieces are not riders (see Pieces)
+        leaps, _, _ = self._move_tables[piece][index]
+        return royal_index in leaps
 
     def _end_turn(self):
         self._player_to_move = self.NUM_PLAYERS - self._player_to_move - 1
+        self._key ^= self._ZOBRIST_PLAYER
+
+        cached = self._statuses.get(self._key)
+        if cached:
+            self._checking_piece = cached[1]
+        elif self._is_in_check(self._player_to_move):
+            self._checking_piece = \
+                self._piece_giving_check_to(self._player_to_move)
+        else:
+            self._checking_piece = None
 
-        self._checking_piece = \
-            self._piece_giving_check_to(self._player_to_move)
+    def _is_in_check(self, player):
+        royal_index = self._royal_squares[player]
+        if royal_index is None:  # player has no royal piece
+            return False
+
+        opponent = self.NUM_PLAYERS - player - 1
+        return self._attacks[opponent][royal_index] > 0
 
     def _is_piece_allowed_on_rank(self, abbrev, player, rank):
         num_restricted = self._pieces.num_restricted_furthest_ranks(abbrev)
@@ -546,10 +1521,10 @@ class Position:
 
         return num_restricted < self._nth_furthest_rank(player, rank)
 
-    def _in_promotion_zone(self, square):
-        _, rank = square
+    def _in_promotion_zone(self, index):
         return (self._promotion_zone_height() >=
-                self._nth_furthest_rank(self._player_to_move, rank))
+                self._nth_furthest_rank(self._player_to_move,
+                                        self._ranks[index]))
 
     def _nth_furthest_rank(self, player, rank):
         result = {0: rank, 1: self._num_ranks+1 - rank}[player]
@@ -570,12 +1545,12 @@ class Position:
             buffer = ''
             skipped = 0
             for file in reversed(range(1, self._num_files+1)):
-                piece = self._board.get((file, rank))
+                piece = self._board[self._index((file, rank))]
                 if piece:
                     if skipped > 0:
                         buffer += str(skipped)
                         skipped = 0
-                    buffer += self._sfen_piece(piece)
+                    buffer += self.sfen_piece(piece)
                 else:
                     skipped += 1
             if skipped > 0:
@@ -605,7 +1580,7 @@ class Position:
         else:
             buffer = ''
 
-        piece = self._sfen_piece(abbrev)
+        piece = self.sfen_piece(abbrev)
         if player == 1:
             piece = piece.lower()
         buffer += piece
@@ -617,7 +1592,8 @@ class Position:
         return {'b': 0, 'w': 1}[code]
 
     @staticmethod
-    def _sfen_piece(piece):
+    def sfen_piece(piece):
+        # e.g. 'SW@' for 'SW', also used in USI drops
         if re.search('[a-zA-Z]{2}', piece):
             return piece + '@'
         else:
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+
+from move import Move
+from perft import STARTING_POSITIONS, format_move
+from pieces import Pieces
+from position import Position
+from transposition import TranspositionTable
+
+
+class _Aborted(Exception):
+    pass
+
+
+class Search:
+    # Iterative-deepening alpha-beta (negamax) search of the best move or
+    #  drop for the player to move, with a material evaluation (see
+    #  Position.material) so that it plays any variant known to Pieces.
+    #  Scores are from the point of view of the player to move, a position
+    #  without legal moves being lost (there is no stalemate in shogi).
+    MAX_DEPTH = 64
+    MATE_SCORE = 1 << 20  # minus the number of plies until mate
+    CHECK_INTERVAL = 1 << 10  # nodes between time and stop checks
+
+    # quiescence search bounds, in plies: evasions by drop are only searched
+    #  up to QUIESCENCE_DROP_PLIES, and nothing beyond MAX_QUIESCENCE_PLIES
+    QUIESCENCE_DROP_PLIES = 2
+    MAX_QUIESCENCE_PLIES = 16
+
+    # transposition table values are packed as follows:
+    #  - bits 0 to MOVE_BITS-1: best move (packed, see Move), or 0
+    #  - next 2 bits: bound (EXACT, LOWER or UPPER)
+    #  - remaining bits: score (signed)
+    MOVE_BITS = 32
+    MOVE_MASK = (1 << MOVE_BITS) - 1
+    BOUND_SHIFT = MOVE_BITS
+    SCORE_SHIFT = MOVE_BITS + 2
+    EXACT, LOWER, UPPER = 1, 2, 3
+
+    def __init__(self, position, table=None):
+        self._position = position
+        self._table = TranspositionTable() if table is None else table
+
+        # the following data structures are indexed by [ply] then by [slot],
+        #  and by [move]
+        self._killers = [[0, 0] for ply in range(self.MAX_DEPTH)]
+        self._history = {}
+
+        self.nodes = 0
+        self.depth = 0  # i.e. last depth fully searched
+        self.elapsed = 0
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed else 0
+
+    def run(self, max_depth=MAX_DEPTH, max_nodes=None, max_time=None,
+            stop=None, report=None):
+        # returns (move, score) where move is packed (see Move), or None if
+        #  the player to move has no legal move. The search stops after
+        #  max_depth iterations, max_nodes nodes or max_time seconds, or as
+        #  soon as stop (e.g. a threading.Event) is set, keeping the result
+        #  of the last iteration. report, if provided, is called with
+        #  (depth, score, move) after each iteration.
+        if not 1 <= max_depth <= self.MAX_DEPTH:
+            raise ValueError('Invalid depth for search: {}'.format(max_depth))
+
+        self.nodes = 0
+        self.depth = 0
+        self._start = time.perf_counter()
+        self._deadline = None if max_time is None else self._start + max_time
+        self._max_nodes = max_nodes
+        self._stop = stop
+        self._next_check = 0
+        self._ply = 0
+        self._path = set()
+
+        move = score = None
+        try:
+            for depth in range(1, max_depth + 1):
+                self._root_move = self._root_score = None
+                self._check_budget()
+                score = self._alpha_beta(depth, -self.MATE_SCORE - 1,
+                                         self.MATE_SCORE + 1)
+                move = self._root_move
+                self.depth = depth
+                self.elapsed = time.perf_counter() - self._start
+                if report:
+                    report(depth, score, move)
+                if move is None or abs(score) >= self.MATE_SCORE - depth:
+                    break  # mate found, deeper searches won't change it
+        except _Aborted:  # moves already popped on the way up
+            if self._root_move is not None:
+                # searched first, so that only a better move can replace it
+                move, score = self._root_move, self._root_score
+            elif move is None:
+                move = next(iter(self._position.legal_moves()), None)
+
+        self.elapsed = time.perf_counter() - self._start
+        return move, score
+
+    def principal_variation(self):
+        # i.e. best moves (packed) of both players after the last search,
+        #  according to the transposition table
+        position = self._position
+        result = []
+        keys = set()
+        while len(result) < self.depth and position.key not in keys:
+            keys.add(position.key)
+            entry = self._table.probe(position.key)
+            move = entry and entry[1] & self.MOVE_MASK
+            if not move or not position.is_legal(move):
+                break
+            position.push(move)
+            result.append(move)
+
+        for move in result:
+            position.pop()
+        return result
+
+    def _alpha_beta(self, depth, alpha, beta):
+        if depth <= 0:
+            return self._quiescence(alpha, beta)
+
+        self._count_node()
+        position = self._position
+        ply = self._ply
+        key = position.key
+        if ply and key in self._path:
+            return 0  # repetition
+
+        move, score = self._probe(key, depth, alpha, beta)
+        if score is not None:
+            return score
+
+        original_alpha = alpha
+        player = position.player_to_move
+        opponent = position.NUM_PLAYERS - player - 1
+        best_score = -self.MATE_SCORE + ply  # i.e. no legal move
+        best_move = 0
+        self._path.add(key)
+        for move in self._ordered_moves(move):
+            material = position.material(opponent)
+            self._push(move)
+            try:
+                quiet = position.material(opponent) == material
+                score = -self._alpha_beta(depth - 1, -beta, -alpha)
+            finally:
+                self._pop()
+
+            if score > best_score:
+                best_score, best_move = score, move
+                if ply == 0:
+                    self._root_move, self._root_score = move, score
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if quiet:
+                    self._remember_cutoff(move, depth)
+                break
+        self._path.discard(key)
+
+        self._store(key, depth, best_score, best_move, original_alpha, beta)
+        return best_score
+
+    def _probe(self, key, depth, alpha, beta):
+        # returns (best move or 0, score) from the transposition table, score
+        #  being None unless it is good enough to skip the search
+        entry = self._table.probe(key)
+        if not entry:
+            return 0, None
+
+        entry_depth, value = entry
+        move = value & self.MOVE_MASK
+        if self._ply and entry_depth >= depth:
+            score = self._from_table(value >> self.SCORE_SHIFT)
+            bound = (value >> self.BOUND_SHIFT) & 3
+            if bound == self.EXACT or \
+               (bound == self.LOWER and score >= beta) or \
+               (bound == self.UPPER and score <= alpha):
+                return move, score
+        return move, None
+
+    def _store(self, key, depth, score, move, alpha, beta):
+        # alpha and beta being the search window of the position
+        if score <= alpha:
+            bound = self.UPPER
+        elif score >= beta:
+            bound = self.LOWER
+        else:
+            bound = self.EXACT
+        self._table.store(key, depth, self._to_table(score) <<
+                          self.SCORE_SHIFT | bound << self.BOUND_SHIFT | move)
+
+    def _quiescence(self, alpha, beta, depth=0):
+        # i.e. only captures worth it (see Position.see) are searched, unless
+        #  the player to move is in check, depth plies after _alpha_beta
+        self._count_node()
+        position = self._position
+        player = position.player_to_move
+        opponent = position.NUM_PLAYERS - player - 1
+        score = position.material(player) - position.material(opponent)
+        royal_square = position.royal_square(player)
+        if royal_square and position.is_attacked(royal_square, opponent):
+            moves = position.legal_moves()
+            if not moves:
+                return -self.MATE_SCORE + self._ply
+            if depth >= self.QUIESCENCE_DROP_PLIES:
+                moves = [move for move in moves if not move >> Move.DROP_SHIFT]
+            if not moves or depth >= self.MAX_QUIESCENCE_PLIES:
+                return score  # i.e. not to search checks forever
+        else:
+            if score >= beta or depth >= self.MAX_QUIESCENCE_PLIES:
+                return score
+            alpha = max(alpha, score)
+            moves = (move for move in position.captures()
+                     if position.see(move) >= 0)
+
+        for move in moves:
+            self._push(move)
+            try:
+                score = -self._quiescence(-beta, -alpha, depth + 1)
+            finally:
+                self._pop()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def _ordered_moves(self, best_move):
+        # i.e. legal moves and drops in the following order: best move from
+        #  the transposition table, captures, killer moves, then other moves
+        #  and drops sorted by history
+        position = self._position
+        if best_move and position.is_legal(best_move):
+            yield best_move
+        skipped = {best_move}
+
+        for move in position.captures():
+            if move not in skipped:
+                skipped.add(move)
+                yield move
+
+        for move in self._killers[self._ply]:
+            if move not in skipped and position.is_legal(move):
+                skipped.add(move)
+                yield move
+
+        history = self._history
+        yield from sorted((move for move in position.legal_moves()
+                           if move not in skipped),
+                          key=lambda move: -history.get(move, 0))
+
+    def _remember_cutoff(self, move, depth):
+        killers = self._killers[self._ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self._history[move] = self._history.get(move, 0) + depth * depth
+
+    def _push(self, move):
+        self._position.push(move)
+        self._ply += 1
+
+    def _pop(self):
+        self._position.pop()
+        self._ply -= 1
+
+    def _count_node(self):
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_budget()
+
+    def _check_budget(self):
+        if (self._max_nodes is not None and self.nodes >= self._max_nodes) \
+           or (self._deadline is not None and
+               time.perf_counter() >= self._deadline) \
+           or (self._stop is not None and self._stop.is_set()):
+            raise _Aborted
+
+        self._next_check = self.nodes + self.CHECK_INTERVAL
+        if self._max_nodes is not None:
+            self._next_check = min(self._next_check, self._max_nodes)
+
+    def _to_table(self, score):
+        # mate scores are stored relative to the current position
+        if score > self.MATE_SCORE - self.MAX_DEPTH * 2:
+            return score + self._ply
+        elif score < -self.MATE_SCORE + self.MAX_DEPTH * 2:
+            return score - self._ply
+        return score
+
+    def _from_table(self, score):
+        if score > self.MATE_SCORE - self.MAX_DEPTH * 2:
+            return score - self._ply
+        elif score < -self.MATE_SCORE + self.MAX_DEPTH * 2:
+            return score + self._ply
+        return score
+
+
+def _format_score(score):
+    if score is None:
+        return '?'
+    elif abs(score) > Search.MATE_SCORE - Search.MAX_DEPTH * 2:
+        plies = Search.MATE_SCORE - abs(score)
+        return 'mate in {} plies'.format(plies if score > 0 else -plies)
+    return str(score)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('position',
+                        help='SFEN position, or one of: {}'.format(
+                            ', '.join(STARTING_POSITIONS)))
+    parser.add_argument('--depth', type=int, default=Search.MAX_DEPTH,
+                        help='maximum number of plies (default: {})'
+                             .format(Search.MAX_DEPTH))
+    parser.add_argument('--nodes', type=int,
+                        help='maximum number of nodes')
+    parser.add_argument('--time', type=float, metavar='SECONDS',
+                        help='maximum search time')
+    parser.add_argument('--hash', type=int, metavar='MB', default=16,
+                        help='transposition table size (default: 16)')
+    args = parser.parse_args()
+    if args.depth == Search.MAX_DEPTH and args.nodes is None and \
+       args.time is None:
+        parser.error('at least one of --depth, --nodes and --time is needed')
+
+    sfen = STARTING_POSITIONS.get(args.position, args.position)
+    position = Position(sfen, Pieces())
+    search = Search(position, TranspositionTable(args.hash << 20))
+
+    def report(depth, score, move):
+        print('Depth {}: {} nodes in {:.3f}s ({:.0f} nodes/s), score {}, '
+              'PV {}'.format(depth, search.nodes, search.elapsed,
+                             search.nodes_per_second, _format_score(score),
+                             ' '.join(format_move(position.unpack_move(move))
+                                      for move in
+                                      search.principal_variation())))
+
+    move, score = search.run(args.depth, args.nodes, args.time,
+                             report=report)
+    print('Best move: {} (score {})'.format(
+        format_move(position.unpack_move(move)) if move else 'none',
+        _format_score(score)))
+    print('Depth: {}'.format(search.depth))
+    print('Nodes: {}'.format(search.nodes))
+    print('Time: {:.3f}s ({:.0f} nodes/s)'.format(search.elapsed,
+                                                  search.nodes_per_second))
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import weakref
+
+from multiprocessing import resource_tracker, shared_memory, util
+
+
+class SharedTranspositionTable:
+    # Same as TranspositionTable, but in shared memory so that several
+    #  processes can probe and store at once: unpickling the table (e.g.
+    #  handed over once to the initializer of each worker process, see
+    #  close_at_exit) attaches to the same memory instead of copying it.
+    #  There is no lock: each entry is written as (key ^ data, data), data
+    #  packing depth and value, so that an entry half-written by another
+    #  process does not match its key anymore and is simply missed.
+    ENTRY_SIZE = 8 + 8  # key ^ data, and data, in bytes
+    BUCKET_SIZE = 2
+    DEFAULT_MEMORY = 16 << 20
+
+    # data is packed as follows:
+    #  - bits 0 to DEPTH_BITS-1: 1 + depth, so that 0 stands for empty
+    #  - remaining bits: value (signed)
+    DEPTH_BITS = 8
+    DEPTH_MASK = (1 << DEPTH_BITS) - 1
+    VALUE_BITS = 64 - DEPTH_BITS
+    MAX_DEPTH = DEPTH_MASK - 1
+
+    def __init__(self, memory=DEFAULT_MEMORY, name=None):
+        # creates the table, or attaches to the existing one called name,
+        #  which must have been created with the same memory
+        num_buckets = 1
+        while 2 * num_buckets * self.BUCKET_SIZE * self.ENTRY_SIZE <= memory:
+            num_buckets *= 2
+        size = num_buckets * self.BUCKET_SIZE * self.ENTRY_SIZE
+        if size > memory:
+            raise ValueError('Not enough memory for transposition table: {}'
+                             .format(memory))
+        self._mask = num_buckets - 1
+        self._requested_memory = memory
+
+        if name is None:
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+            self._owner_pid = os.getpid()  # i.e. not its forked children
+        else:
+            self._memory = self._attach(name)
+            self._owner_pid = None
+
+        # i.e. key ^ data at even indices, data at odd ones
+        self._entries = self._memory.buf[:size].cast('Q')
+        # the view has to be released before the memory is closed, even if
+        #  close() is never called
+        self._finalizer = weakref.finalize(
+            self, self._close, self._entries, self._memory, self._owner_pid)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+
+    @staticmethod
+    def _attach(name):
+        # only the creator may unlink the memory. Worker processes share the
+        #  resource tracker of their parent, where the creator registered
+        #  it, hence must not unregister it; a tracker started for this
+        #  attachment though would unlink the memory once this process is over
+        if sys.version_info >= (3, 13):
+            return shared_memory.SharedMemory(name=name, track=False)
+
+        own_tracker = resource_tracker._resource_tracker._fd is None
+        memory = shared_memory.SharedMemory(name=name)
+        if own_tracker:
+            resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def __reduce__(self):
+        return self.__class__, (self._requested_memory, self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        # detaches from the shared memory, which is freed when its creator
+        #  closes it
+        self._finalizer()
+
+    def close_at_exit(self):
+        # e.g. from the initializer of a worker process, which does not run
+        #  atexit hooks when over
+        util.Finalize(None, self.close, exitpriority=0)
+
+    @staticmethod
+    def _close(entries, memory, owner_pid):
+        entries.release()
+        memory.close()
+        if owner_pid == os.getpid():
+            memory.unlink()
+
+    def __len__(self):
+        # i.e. number of entries, occupied or not
+        return len(self._entries) // 2
+
+    def probe(self, key):
+        # returns (depth, value) stored for key, or None
+        entries = self._entries
+        index = (key & self._mask) * self.BUCKET_SIZE * 2
+        for index in range(index, index + self.BUCKET_SIZE * 2, 2):
+            data = entries[index + 1]
+            if data and entries[index] ^ data == key:
+                self.hits += 1
+                return self._unpack(data)
+
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value):
+        if not 0 <= depth <= self.MAX_DEPTH:
+            raise ValueError('Invalid depth for transposition table: {}'
+                             .format(depth))
+        elif not -1 << (self.VALUE_BITS - 1) <= value < \
+                1 << (self.VALUE_BITS - 1):
+            raise ValueError('Invalid value for transposition table: {}'
+                             .format(value))
+
+        entries = self._entries
+        index = (key & self._mask) * self.BUCKET_SIZE * 2
+        old_data = entries[index + 1]
+        if (old_data & self.DEPTH_MASK) - 1 > depth and \
+           entries[index] ^ old_data != key:
+            index += 2  # keep the deeper entry
+            old_data = entries[index + 1]
+
+        if old_data and entries[index] ^ old_data != key:
+            self.replacements += 1
+        self.stores += 1
+
+        data = (value & ((1 << self.VALUE_BITS) - 1)) << self.DEPTH_BITS | \
+            (depth + 1)
+        entries[index] = key ^ data
+        entries[index + 1] = data
+
+    def _unpack(self, data):
+        value = data >> self.DEPTH_BITS
+        if value >> (self.VALUE_BITS - 1):
+            value -= 1 << self.VALUE_BITS  # i.e. negative
+        return (data & self.DEPTH_MASK) - 1, value
+
+    def clear(self):
+        size = len(self._entries) * 8
+        self._memory.buf[:size] = bytes(size)
+        self.hits = self.misses = self.stores = self.replacements = 0
+
+    def usage(self):
+        # i.e. fraction of occupied entries
+        return sum(data != 0 for data in self._entries[1::2]) / len(self)
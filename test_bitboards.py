@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from bitboards import Bitboards
+
+
+class BitboardsTestCase(unittest.TestCase):
+    # 3x3 board with a border of one square, i.e. indices from 6 to 18:
+    #   .  .  .  .  .
+    #   .  6  7  8  .   (rank 1, files 3 to 1)
+    #   . 11 12 13  .   (rank 2)
+    #   . 16 17 18  .   (rank 3)
+    #   .  .  .  .  .
+    STRIDE = 5
+
+    def setUp(self):
+        squares = [None] * self.STRIDE**2
+        for rank in range(1, 4):
+            for file in range(1, 4):
+                squares[self.index(file, rank)] = file, rank
+        self._bitboards = Bitboards(squares)
+
+    def test_masks(self):
+        bitboards = self._bitboards
+        self.assertEqual(list(Bitboards.indices(bitboards.board)),
+                         [6, 7, 8, 11, 12, 13, 16, 17, 18])
+        self.assertEqual(list(Bitboards.indices(bitboards.file(1))),
+                         [8, 13, 18])
+        self.assertEqual(list(Bitboards.indices(bitboards.rank(2))),
+                         [11, 12, 13])
+        self.assertEqual(bitboards.empty, bitboards.board)
+
+    def test_toggle(self):
+        bitboards = self._bitboards
+        bitboards.toggle(12, 'P', 0)
+        bitboards.toggle(6, 'p', 1)
+        self.assertEqual(list(Bitboards.indices(bitboards.occupied)), [6, 12])
+        self.assertEqual(bitboards.player(0), 1 << 12)
+        self.assertEqual(bitboards.piece('p'), 1 << 6)
+        self.assertEqual(bitboards.piece('P'), 1 << 12)
+
+        bitboards.toggle(12, 'P', 0)
+        self.assertEqual(bitboards.player(0), 0)
+        self.assertEqual(bitboards.piece('P'), 0)
+
+    def test_rays(self):
+        bitboards = self._bitboards
+        self.assertEqual(list(Bitboards.indices(bitboards.ray(6, 1))), [7, 8])
+        self.assertEqual(list(Bitboards.indices(bitboards.ray(6, 1, 1))), [7])
+        self.assertEqual(list(Bitboards.indices(bitboards.ray(18, -6))),
+                         [6, 12])
+        self.assertEqual(bitboards.ray(8, 1), 0)  # edge of the board
+        self.assertEqual(bitboards.full_rays(self.STRIDE)[6],
+                         bitboards.ray(6, self.STRIDE))
+
+    def test_attacks(self):
+        bitboards = self._bitboards
+        bitboards.toggle(7, 'p', 1)
+        self.assertEqual(list(Bitboards.indices(bitboards.attacks(8, -1, 0))),
+                         [7])  # blocked
+        self.assertEqual(list(Bitboards.indices(bitboards.attacks(18, -5, 0))),
+                         [8, 13])
+        self.assertEqual(list(Bitboards.indices(bitboards.attacks(6, 12, 1))),
+                         [18])  # leaper
+        self.assertEqual(bitboards.attacks(6, -1, 1), 0)  # outside the board
+        self.assertEqual(list(Bitboards.indices(bitboards.attacks(8, -1, 0,
+                                                                  0))),
+                         [6, 7])  # as if the board was empty
+
+    def test_nearest(self):
+        mask = 1 << 7 | 1 << 17
+        self.assertEqual(Bitboards.nearest(mask, 5), 7)
+        self.assertEqual(Bitboards.nearest(mask, -5), 17)
+
+    def index(self, file, rank):
+        return rank * self.STRIDE + 4 - file
+
+
+if __name__ == '__main__':
+    unittest.main()
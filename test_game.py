@@ -53,6 +53,7 @@ class PositionTestCase(unittest.TestCase):
         game.drop('BD', (2, 2))
         self.assertEqual(game.half_moves, 1)
         self.assertEqual(game.result(), (0, 'stalemate'))
+        self.assertEqual(game.legal_moves(), [])
 
     def test_game_draw_by_fourfold(self):
         game = Game('2k/3/K2 b -', self._pieces, True)
@@ -71,6 +72,43 @@ class PositionTestCase(unittest.TestCase):
         self.assertEqual(game.result(), (game.NUM_PLAYERS,
                                          'fourfold repetition'))
 
+    def test_game_replay_without_checks(self):
+        game = Game('2k/3/K2 b P', self._pieces, True)
+        game.apply_drop('P', (2, 3))
+        game.apply_move((1, 1), (1, 2))
+        game.apply_move((2, 3), (2, 2))
+        self.assertEqual(game.half_moves, 3)
+        self.assertEqual(game.sfen, '3/1Pk/K2 w -')
+        self.assertEqual(game.result(), (None, 'in progress'))
+
+    def test_game_push_and_pop(self):
+        game = Game('2k/3/K2 b -', self._pieces, True)
+        game.push(((3, 3), (3, 2), False))
+        game.push(((1, 1), (1, 2), False))
+        moves = [((3, 2), (3, 1), False), ((1, 2), (1, 3), False),
+                 ((3, 1), (3, 2), False), ((1, 3), (1, 2), False)] * 3
+        for move in moves:
+            game.push(move)
+        self.assertEqual(game.result(), (game.NUM_PLAYERS,
+                                         'fourfold repetition'))
+
+        self.assertEqual(game.pop(), moves[-1])
+        self.assertEqual(game.result(), (None, 'in progress'))
+        self.assertEqual(game.half_moves, 13)
+        for _ in range(13):
+            game.pop()
+        self.assertEqual(game.sfen, '2k/3/K2 b -')
+
+        game = Game('1k1/3/1K1 w P', self._pieces, True)
+        for move in [((2, 1), (1, 1), False), ((2, 3), (3, 3), False),
+                     ((1, 1), (1, 2), False), ((3, 3), (3, 2), False),
+                     ((1, 2), (1, 3), False), ((3, 2), (3, 1), False),
+                     ((1, 3), (2, 3), False)]:
+            game.push(move)
+        self.assertEqual(game.result(), (1, 'try rule'))
+        game.pop()
+        self.assertEqual(game.result(), (None, 'in progress'))
+
     def test_game_win_due_to_perpetual_check(self):
         game = Game('1k1/2r/K2 w -', self._pieces, True)
         game.move((1, 2), (3, 2))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import threading
+import unittest
+
+from game import Game
+from mcts import Mcts
+from perft import STARTING_POSITIONS
+from pieces import Pieces
+
+
+class MctsTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._pieces = Pieces()
+
+    def test_mate_in_one(self):
+        game = Game('4k4/9/4P4/9/9/9/9/9/4K4 b G', self._pieces, False)
+        mcts = Mcts(game, max_plies=20, seed=0)
+        move = mcts.run(400)
+        self.assertEqual(game.unpack_move(move), ('G', (5, 2)))
+        self.assertEqual(mcts.statistics()[0][::2], (move, 1))
+        self.assertEqual(mcts.playouts, 400)
+
+        # the game is left unchanged
+        self.assertEqual(game.sfen, '4k4/9/4P4/9/9/9/9/9/4K4 b G')
+        self.assertEqual(game.half_moves, 0)
+
+    def test_game_decided(self):
+        game = Game('1k1/3/1K1 b BD@', self._pieces, True)
+        game.drop('BD', (2, 2))
+        mcts = Mcts(game)
+        self.assertIsNone(mcts.run(10))
+        self.assertEqual(mcts.playouts, 0)
+
+    def test_statistics(self):
+        game = Game(STARTING_POSITIONS['tori'], self._pieces, True)
+        mcts = Mcts(game, max_plies=30, seed=1)
+        move = mcts.run(17)
+        self.assertIn(move, game.legal_moves())
+        self.assertEqual(mcts.playouts, 17)
+        self.assertEqual(len(mcts.statistics()), 17)
+        self.assertLessEqual(mcts.max_playout_plies, 30)
+        self.assertLessEqual(mcts.average_playout_plies, 30)
+        self.assertEqual(mcts.max_tree_depth, 1)  # i.e. each move tried once
+        self.assertGreater(mcts.playouts_per_second, 0)
+        self.assertEqual(game.sfen, STARTING_POSITIONS['tori'])
+
+        stop = threading.Event()
+        stop.set()
+        mcts.run(stop=stop)
+        self.assertEqual(mcts.playouts, 17)
+
+        mcts.run(20)  # i.e. the same tree grows
+        self.assertEqual(mcts.max_tree_depth, 2)
+        self.assertEqual(sum(visits for _, visits, _ in mcts.statistics()),
+                         20)
+
+        with self.assertRaisesRegex(ValueError, 'Unlimited search'):
+            mcts.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
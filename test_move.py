@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from move import Move
+from pieces import Pieces
+from position import Position
+
+
+class MoveTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._pieces = Pieces()
+
+    def test_move(self):
+        move = Move(Move.pack(42, 1234, True))
+        self.assertEqual(move.index, 42)
+        self.assertEqual(move.dest_index, 1234)
+        self.assertTrue(move.promotes)
+        self.assertEqual(move.drop_id, 0)
+        self.assertFalse(move.is_drop())
+
+        self.assertFalse(Move(Move.pack(42, 1234)).promotes)
+        self.assertNotEqual(Move(Move.pack(42, 1234)), move)
+
+    def test_drop(self):
+        move = Move(Move.pack_drop(3, 42))
+        self.assertIsNone(move.index)
+        self.assertEqual(move.dest_index, 42)
+        self.assertFalse(move.promotes)
+        self.assertEqual(move.drop_id, 3)
+        self.assertTrue(move.is_drop())
+
+    def test_equality_and_hash(self):
+        move = Move(Move.pack(42, 1234))
+        self.assertEqual(move, Move(int(move)))
+        self.assertEqual(len({move, Move(move.value)}), 1)
+        self.assertNotEqual(move, move.value)
+        self.assertEqual(repr(move), 'Move({})'.format(move.value))
+
+    def test_tuple_conversion(self):
+        position = Position('1+rk1/4/4/KL2 b Pp', self._pieces)
+        for move in (((3, 4), (3, 1), True), ((3, 4), (3, 2), False),
+                     ('P', (2, 3))):
+            self.assertEqual(Move.from_tuple(position, move)
+                             .to_tuple(position), move)
+
+        move = Move.from_tuple(position, ('P', (2, 3)))
+        self.assertTrue(move.is_drop())
+        self.assertEqual(position.droppable_pieces[move.drop_id - 1], 'P')
+
+        position.push(Move.from_tuple(position, ((3, 4), (3, 1), True)))
+        self.assertEqual(str(position), '1+Lk1/4/4/K3 w RPp')
+        self.assertEqual(position.pop(), ((3, 4), (3, 1), True))
+
+    def test_board_too_large(self):
+        sfen = 'k63/' + '/'.join(['64'] * 62) + '/63K b -'
+        with self.assertRaisesRegex(ValueError,
+                                    'Too many squares for packed moves'):
+            Position(sfen, self._pieces)
+
+
+if __name__ == '__main__':
+    unittest.main()
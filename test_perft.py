@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from perft import Perft, REFERENCE_COUNTS, STARTING_POSITIONS
+from pieces import Pieces
+from position import Position
+from shared_transposition import SharedTranspositionTable
+from transposition import TranspositionTable
+
+
+class PerftTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._pieces = Pieces()
+
+    def test_starting_positions(self):
+        for variant, sfen in STARTING_POSITIONS.items():
+            perft = Perft(Position(sfen, self._pieces))
+            for depth, expected in enumerate(REFERENCE_COUNTS[variant][:2],
+                                             1):
+                self.assertEqual(perft.count(depth), expected,
+                                 '{} at depth {}'.format(variant, depth))
+
+    def test_count_promotions_and_drops(self):
+        position = Position('1+rk1/4/4/KL2 b Pp', self._pieces)
+        perft = Perft(position)
+        self.assertEqual(perft.count(0), 1)
+        self.assertEqual(perft.count(1), 14)  # see test_legal_moves
+        self.assertEqual(str(position), '1+rk1/4/4/KL2 b Pp')
+
+    def test_cached_count(self):
+        position = Position(STARTING_POSITIONS['tori'], self._pieces)
+        table = TranspositionTable()
+        perft = Perft(position)
+        self.assertEqual(perft.cached_count(4, table),
+                         REFERENCE_COUNTS['tori'][3])
+        self.assertGreater(table.hits, 0)  # e.g. swallows moved in any order
+        self.assertEqual(str(position), STARTING_POSITIONS['tori'])
+
+    def test_divide(self):
+        position = Position('1+rk1/4/4/KL2 b Pp', self._pieces)
+        perft = Perft(position)
+        counts = perft.divide(2)
+        self.assertEqual(len(counts), 14)
+        self.assertEqual(sum(counts.values()), perft.count(2))
+        self.assertEqual(counts[((3, 4), (3, 1), True)], 4)  # in check
+
+        with self.assertRaisesRegex(ValueError, 'Invalid depth for divide'):
+            perft.divide(0)
+
+    def test_parallel_count(self):
+        position = Position(STARTING_POSITIONS['tori'], self._pieces)
+        perft = Perft(position)
+        for split_depth in (1, 2):
+            count, stats = perft.parallel_count(3, 2, split_depth)
+            self.assertEqual(count, REFERENCE_COUNTS['tori'][2])
+            self.assertEqual(sum(nodes for nodes, _ in stats.values()),
+                             count)
+        self.assertEqual(str(position), STARTING_POSITIONS['tori'])
+
+        self.assertEqual(perft.parallel_count(1, 2), (17, {}))  # too shallow
+
+    def test_parallel_count_with_shared_table(self):
+        position = Position(STARTING_POSITIONS['tori'], self._pieces)
+        perft = Perft(position)
+        with SharedTranspositionTable(1 << 20) as table:
+            count, _ = perft.parallel_count(4, 2, 1, table)
+            self.assertEqual(count, REFERENCE_COUNTS['tori'][3])
+            self.assertGreater(table.usage(), 0)
+
+            # i.e. counted again from what the workers stored
+            self.assertEqual(perft.cached_count(4, table), count)
+            self.assertGreater(table.hits, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -30,6 +30,12 @@ class PiecesTestCase(unittest.TestCase):
         self.assertEqual(pieces.directions('P'), {(0, 1): 1})
         self.assertEqual(pieces.num_restricted_furthest_ranks('N'), 2)
 
+        self.assertEqual(pieces.value('P'), 1)
+        self.assertEqual(pieces.value('G'), 6)
+        self.assertEqual(pieces.value('R'), 16)
+        self.assertEqual(pieces.value('+R'), 20)
+        self.assertEqual(pieces.value('K'), pieces.ROYAL_VALUE)
+
     def test_invalid_abbreviation(self):
         with self.assertRaisesRegex(PiecesException,
                                     'Invalid piece abbreviation: Ph'):
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
+import random
 import unittest
 
+from move import Move
 from pieces import Pieces
 from position import Position
 
@@ -24,6 +26,8 @@ class PositionTestCase(unittest.TestCase):
         self.assertEqual(position.get((2, 8)), '+r')
         self.assertEqual(position.in_hand(1), {'B': 1, 'G': 1, 'N': 1, 'P': 3})
         self.assertEqual(position.royal_square(1), (9, 4))
+        self.assertIsNone(position.get((10, 4)))  # outside the board
+        self.assertIsNone(position.get((9, 0)))
 
         with self.assertRaisesRegex(ValueError, r'Square \(9, 2\) is empty'):
             next(position.legal_moves_from_square((9, 2)))
@@ -151,6 +155,29 @@ class PositionTestCase(unittest.TestCase):
     def test_in_check(self):
         self.check('k2/1p1/L2 w -', expected_status='check')
 
+    def test_check_by_new_directions_after_promotion(self):
+        # no other piece than a goose jumps two squares backward
+        position = self.check("3/S'2/k2 b -")
+        position.move((3, 2), (3, 1), True)
+        self.assertEqual(str(position), "+S'2/3/k2 w -")
+        self.assertEqual(position.status(), 'check')
+
+    def test_attackers(self):
+        position = self.check('k2/1p1/L2 w -', expected_status='check')
+        self.assertEqual(position.attackers((3, 1), 0), [(3, 3)])
+        self.assertEqual(position.attackers((2, 2), 1), [(3, 1)])  # protected
+        self.assertTrue(position.is_attacked((2, 3), 1))
+        self.assertFalse(position.is_attacked((1, 3), 1))
+
+        position.move((3, 1), (2, 1))
+        self.assertEqual(position.attackers((3, 1), 0), [(3, 3)])
+        self.assertTrue(position.is_attacked((3, 1), 1))
+        self.assertFalse(position.is_attacked((1, 3), 1))
+
+        position.move((3, 3), (3, 2))
+        self.assertEqual(position.attackers((3, 2), 1), [(2, 1)])
+        self.assertFalse(position.is_attacked((3, 3), 0))
+
     def test_in_double_check(self):
         self.check('k2/1B1/3/L2 w -', 3, 4, expected_status='check')
 
@@ -230,6 +257,29 @@ class PositionTestCase(unittest.TestCase):
         self.assertEqual(set(position.legal_moves_from_square((5, 2))),  # CE
                          {(2, 5)})
 
+    def test_overlapping_directions(self):
+        # second step of the rook and forward D leap reach the same square
+        pieces = Pieces('support/overlapping_directions.yaml')
+        position = Position('2k/3/3/X2 b -', pieces)
+        self.assertEqual(sorted(position.legal_moves_from_square((3, 4))),
+                         [(3, 1), (3, 2), (3, 3)])
+
+    def test_pinned_piece(self):
+        position = self.check('2r/3/2G/3/k1K b -', 3, 5)
+        self.assertEqual(set(position.legal_moves_from_square((1, 3))),
+                         {(1, 2), (1, 4)})  # along the file only
+
+    def test_pinned_by_cloud_eagle(self):
+        # since it has a limited range (3) diagonally forward
+        position = self.check('ce@4/1G3/5/3K1/k4 b -', 5, 5)
+        self.assertEqual(set(position.legal_moves_from_square((4, 2))),
+                         {(5, 1)})  # captures cloud eagle
+        position = self.check('ce@4/1G3/5/5/k3K b -', 5, 5)  # out of range
+        self.assertEqual(set(position.legal_moves_from_square((4, 2))),
+                         {(5, 1), (4, 1), (3, 1),
+                          (5, 2),         (3, 2),
+                                  (4, 3)})                               # noqa
+
     def test_elementary_stalemate(self):
         self.check("2k/3/KQ'1 w R", expected_status='stalemate')  # with queen
         self.check('2k/1r1/K2 b -', expected_status='stalemate')  # with rook
@@ -382,12 +432,37 @@ class PositionTestCase(unittest.TestCase):
         position.drop('P', (2, 3))
         self.assertEqual(str(position), '2k/1p1/KPP w -')
 
+    def test_pawn_drop_mate(self):
+        position = self.check('1lk/3/1G1/K2 b P', 3, 4)
+        self.assertNotIn((1, 2), set(position.legal_drops_with_piece('P')))
+        with self.assertRaisesRegex(ValueError, 'Illegal drop'):
+            position.drop('P', (1, 2))  # uchifuzume
+
+        # same check, but the king can now capture the pawn
+        position = self.check('1lk/3/3/K1G b P', 3, 4)
+        position.drop('P', (1, 2))
+        self.assertEqual(str(position), '1lk/2P/3/K1G w -')
+        self.assertEqual(position.status(), 'check')
+
     def test_other_drop(self):
         position = self.check('2k/3/K2 w 3s')
         position.drop('S', (2, 2))
         self.assertEqual(str(position), '2k/1s1/K2 b 2s')
         self.assertEqual(position.status(), 'check')
 
+    def test_drops_in_check(self):
+        position = self.check('k3R/5/5/5/4K w 2sp', 5, 5,
+                              expected_status='check')
+        for abbrev in ('S', 'P'):
+            self.assertEqual(set(position.legal_drops_with_piece(abbrev)),
+                             {(4, 1), (3, 1), (2, 1)})  # interpositions
+
+        position = self.check('k4/5/5/5/4K w 2sp', 5, 5)
+        self.assertEqual(len(list(position.legal_drops_with_piece('S'))),
+                         23)
+        self.assertEqual(len(list(position.legal_drops_with_piece('P'))),
+                         19)  # not on furthest rank
+
     def test_drop_with_new_directions(self):
         position = self.check('1k1/3/3/3/K2 b N', 3, 5)
         self.assertEqual(position.droppable_pieces, ['N'])
@@ -447,6 +522,20 @@ class PositionTestCase(unittest.TestCase):
         with self.assertRaisesRegex(ValueError, 'Illegal drop'):
             position.drop('P', (3, 1))  # nifu
 
+    def test_drop_of_captured_promoted_piece(self):
+        # the pawn only appears once the tokin is captured
+        position = self.check('k4/5/5/5/3+pK b -', 5, 5,
+                              expected_status='check')
+        position.move((1, 5), (2, 5))
+        position.move((5, 1), (5, 2))
+        position.drop('P', (3, 3))
+        position.move((5, 2), (5, 1))
+        self.assertEqual(str(position), 'k4/5/2P2/5/3K1 b -')
+        self.assertEqual(list(position.legal_moves_from_square((3, 3))),
+                         [(3, 2)])
+        self.assertEqual(position.key,
+                         Position(str(position), self._pieces).key)
+
     def test_deferred_promotion(self):
         sfen = '2k/SPs/K2 b -'
         position = self.check(sfen)
@@ -462,6 +551,260 @@ class PositionTestCase(unittest.TestCase):
         position.choose_promotion(False)     # no thanks
         self.assertEqual(str(position), '+S1k/1P1/K1s b -')
 
+    def test_push_and_pop(self):
+        sfen = '1+rk1/4/4/KL2 b Pp'
+        position = self.check(sfen, 4, 4)
+
+        position.push(((3, 4), (3, 1), True))  # promotes and capture promoted
+        self.assertEqual(str(position), '1+Lk1/4/4/K3 w RPp')
+        self.assertEqual(position.status(), 'check')
+        position.push(((2, 1), (2, 2), False))  # king moves
+        self.assertEqual(position.royal_square(1), (2, 2))
+        position.push(('P', (2, 3)))
+        self.assertEqual(str(position), '1+L2/2k1/2P1/K3 w Rp')
+        position.push(((2, 2), (2, 3), False))  # king captures pawn
+        self.assertEqual(str(position), '1+L2/4/2k1/K3 b R2p')
+
+        self.assertEqual(position.pop(), ((2, 2), (2, 3), False))
+        self.assertEqual(position.status(), 'check')
+        self.assertEqual(position.pop(), ('P', (2, 3)))
+        self.assertEqual(position.pop(), ((2, 1), (2, 2), False))
+        self.assertEqual(position.royal_square(1), (2, 1))
+        self.assertEqual(position.pop(), ((3, 4), (3, 1), True))
+        self.assertEqual(str(position), sfen)
+        self.assertEqual(position.status(), '')
+
+        with self.assertRaisesRegex(ValueError, 'No move to undo'):
+            position.pop()
+
+    def test_pop_captured_pawn_and_deferred_promotion(self):
+        sfen = '2k/SPs/K2 b -'
+        position = self.check(sfen)
+
+        position.move((3, 2), (3, 1), None)  # can promote
+        position.choose_promotion(True)
+        position.push(((1, 2), (2, 3), False))  # no promotion (S)
+        position.push(((2, 2), (2, 1), True))  # must promote (P)
+        position.pop()
+        position.push(((3, 3), (2, 3), False))  # captures silver
+        self.assertEqual(str(position), '+S1k/1P1/1K1 w S')
+
+        self.assertEqual(position.pop(), ((3, 3), (2, 3), False))
+        self.assertEqual(position.pop(), ((1, 2), (2, 3), False))
+        self.assertEqual(position.pop(), ((3, 2), (3, 1), True))
+        self.assertEqual(str(position), sfen)
+
+    def test_key(self):
+        sfen = 'k3/4/4/3K b 2G2g'
+        position = self.check(sfen, 4, 4)
+        key = position.key
+
+        # same position reached in a different order
+        position.push(('G', (2, 2)))
+        position.push(('G', (3, 3)))
+        position.push(('G', (2, 3)))
+        other_position = Position(sfen, self._pieces)
+        other_position.push(('G', (2, 3)))
+        other_position.push(('G', (3, 3)))
+        other_position.push(('G', (2, 2)))
+        self.assertEqual(position.key, other_position.key)
+        self.assertEqual(position.key,
+                         Position(str(position), self._pieces).key)
+
+        position.pop()
+        position.pop()
+        position.pop()
+        self.assertEqual(position.key, key)
+
+        # player to move and pieces in hand matter
+        for other_sfen in ('k3/4/4/3K w 2G2g', 'k3/4/4/3K b G2g',
+                           'k3/4/4/3K b 2Gg', 'k3/4/4/3K b 2S2g',
+                           'k3/4/4/K3 b 2G2g'):
+            self.assertNotEqual(Position(other_sfen, self._pieces).key, key)
+        self.assertEqual(Position('k3/4/4/3K b 2g2G', self._pieces).key, key)
+
+    def test_legal_moves(self):
+        position = self.check('1+rk1/4/4/KL2 b Pp', 4, 4)
+        self.assertEqual(set(map(position.unpack_move,
+                                 position.legal_moves())),
+                         {((4, 4), (4, 3), False),            # K
+                          ((3, 4), (3, 3), False),            # L
+                          ((3, 4), (3, 2), False),
+                          ((3, 4), (3, 1), True),
+                          ('P', (4, 2)), ('P', (3, 2)), ('P', (2, 2)),
+                          ('P', (1, 2)),
+                          ('P', (4, 3)), ('P', (3, 3)), ('P', (2, 3)),
+                          ('P', (1, 3)),
+                          ('P', (2, 4)), ('P', (1, 4))})
+
+        position = self.check('k2/1p1/L2 w -', expected_status='check')
+        self.assertEqual(list(map(position.unpack_move,
+                                  position.legal_moves())),
+                         [((3, 1), (2, 1), False)])
+
+    def test_check_evasions(self):
+        position = self.check('k3R/1g3/5/5/4K w s', 5, 5,
+                              expected_status='check')
+        self.assertEqual(set(map(position.unpack_move,
+                                 position.legal_moves())),
+                         {((5, 1), (5, 2), False),  # king runs away
+                          ((4, 2), (4, 1), False),  # gold interposes
+                          ('S', (4, 1)), ('S', (3, 1)), ('S', (2, 1))})
+
+        # the gold is now pinned by the bishop
+        position = self.check('k3R/1g3/2B2/5/4K w s', 5, 5,
+                              expected_status='check')
+        self.assertEqual(set(map(position.unpack_move,
+                                 position.legal_moves())),
+                         {((5, 1), (5, 2), False),
+                          ('S', (4, 1)), ('S', (3, 1)), ('S', (2, 1))})
+
+        # double check: only the king may move
+        position = self.check('k3R/5/1g3/5/R3K w s', 5, 5,
+                              expected_status='check')
+        self.assertEqual(list(map(position.unpack_move,
+                                  position.legal_moves())),
+                         [((5, 1), (4, 2), False)])
+        self.check('k3R/1g3/5/5/R3K w s', 5, 5, expected_status='checkmate')
+
+    def test_staged_moves(self):
+        position = self.check('k4/2P2/1g1p1/2S2/4K b -', 5, 5)
+        self.assertEqual(list(map(position.unpack_move,
+                                  position.staged_moves())),
+                         [((3, 4), (4, 3), False),  # captures gold
+                          ((3, 4), (2, 3), False),  # captures pawn
+                          ((3, 2), (3, 1), True),   # promotes
+                          ((3, 4), (4, 5), False),
+                          ((3, 4), (2, 5), False),
+                          ((3, 4), (3, 3), False),
+                          ((1, 5), (1, 4), False),
+                          ((1, 5), (2, 5), False)])
+        self.assertEqual(list(map(position.unpack_move,
+                                  position.captures())),
+                         [((3, 4), (4, 3), False), ((3, 4), (2, 3), False)])
+
+        position = self.check('1+rk1/4/4/KL2 b Pp', 4, 4)
+        staged_moves = list(position.staged_moves())
+        self.assertEqual(position.unpack_move(staged_moves[0]),
+                         ((3, 4), (3, 1), True))
+        self.assertEqual(set(map(position.unpack_move, staged_moves[4:])),
+                         {move for move in map(position.unpack_move,
+                                               position.legal_moves())
+                          if move[0] == 'P'})  # drops come last
+
+    def test_random_move(self):
+        generator = random.Random(0)
+        for sfen in ['1+rk1/4/4/KL2 b Pp',  # promotions and drops
+                     'k3R/1g3/2B2/5/4K w s']:  # check
+            position = Position(sfen, self._pieces)
+            legal_moves = set(position.legal_moves())
+            self.assertEqual({position.random_move(generator)
+                              for _ in range(500)}, legal_moves)
+
+        position = self.check('k3R/1g3/5/5/R3K w s', 5, 5,
+                              expected_status='checkmate')
+        self.assertIsNone(position.random_move(generator))
+
+    def test_checking_moves(self):
+        position = self.check('2k2/5/2S2/5/K1R2 b G', 5, 5)
+        self.assertEqual(set(map(position.unpack_move,
+                                 position.checking_moves())),
+                         {((3, 3), (4, 2), False),  # direct
+                          ((3, 3), (3, 2), False),
+                          ((3, 3), (2, 2), False),
+                          ((3, 3), (4, 4), False),  # discovered
+                          ((3, 3), (2, 4), False),
+                          ('G', (4, 1)), ('G', (2, 1)),
+                          ('G', (4, 2)), ('G', (3, 2)), ('G', (2, 2))})
+
+        position = self.check('2k2/5/2S2/5/K1R2 w G', 5, 5)
+        self.assertEqual(list(position.checking_moves()), [])
+
+    def test_material(self):
+        position = self.check('1+rk1/4/4/KL2 b Pp', 4, 4)
+        self.assertEqual(position.material(0), 4 + 1)  # royal excepted
+        self.assertEqual(position.material(1), 20 + 1)
+
+        position.move((3, 4), (3, 1), True)  # lance promotes and captures
+        self.assertEqual(position.material(0), 6 + 16 + 1)
+        self.assertEqual(position.material(1), 1)
+        position.pop()
+        self.assertEqual(position.material(0), 4 + 1)
+        self.assertEqual(position.material(1), 20 + 1)
+
+    def test_see(self):
+        position = self.check('k4/5/2p2/5/K1R2 b G', 5, 5)
+        self.assertEqual(position.see(((3, 5), (3, 3), False)), 1)
+        self.assertEqual(position.see(('G', (3, 4))), -6 + 1)
+        self.assertEqual(position.see(('G', (3, 2))), 0)  # not attacked
+
+        # the gold recaptures
+        position = self.check('k4/2g2/2p2/5/K1R2 b -', 5, 5)
+        self.assertEqual(position.see(((3, 5), (3, 3), False)), 1 - 16)
+
+        # the rook behind the lance makes recapturing unprofitable
+        position = self.check('k4/2g2/2p2/2L2/K1R2 b -', 5, 5)
+        self.assertEqual(position.see(((3, 4), (3, 3), False)), 1)
+        position = self.check('k4/2g2/2p2/2L2/K1R2 w -', 5, 5)
+        self.assertEqual(position.see(((3, 3), (3, 4), False)), 4 - 1)
+
+        # the king cannot recapture a protected piece
+        position = self.check('k4/1g2R/1P3/5/4K b -', 5, 5)
+        self.assertEqual(position.see(((1, 2), (4, 2), False)), 6)
+        position = self.check('k4/1g2R/5/5/4K b -', 5, 5)
+        self.assertEqual(position.see(((1, 2), (4, 2), False)), 6 - 16)
+
+    def test_is_legal(self):
+        position = self.check('1+rk1/4/4/KL2 b Pp', 4, 4)
+        for move in position.legal_moves():
+            self.assertTrue(position.is_legal(move))
+            self.assertTrue(position.is_legal(Move(move)))
+            self.assertTrue(position.is_legal(position.unpack_move(move)))
+
+        self.assertFalse(position.is_legal(((3, 4), (3, 1), False)))
+        self.assertFalse(position.is_legal(((3, 4), (4, 4), False)))  # K
+        self.assertFalse(position.is_legal(((3, 4), (3, 5), False)))
+        self.assertFalse(position.is_legal(((4, 4), (3, 3), False)))
+        self.assertFalse(position.is_legal(((2, 1), (2, 2), False)))  # his
+        self.assertFalse(position.is_legal(((2, 4), (2, 3), False)))
+        self.assertFalse(position.is_legal(('P', (2, 1))))  # occupied
+        self.assertFalse(position.is_legal(('P', (1, 1))))  # furthest rank
+        self.assertFalse(position.is_legal(('R', (1, 3))))  # not in hand
+        self.assertFalse(position.is_legal(('G', (1, 3))))  # unknown
+
+    def test_apply_move_and_drop(self):
+        position = self.check('1+rk1/4/4/KL2 b Pp', 4, 4)
+        position.apply_move((3, 4), (3, 1), True)
+        position.apply_move((2, 1), (2, 2))
+        position.apply_drop('P', (2, 3))
+        self.assertEqual(str(position), '1+L2/2k1/2P1/K3 w Rp')
+        self.assertEqual(position.status(), 'check')
+
+    def test_status_cache(self):
+        position = self.check('k2/1p1/L2 w -', expected_status='check')
+        position.move((3, 1), (2, 1))
+        self.assertEqual(position.status(), '')
+        position.pop()
+        self.assertEqual(position.status(), 'check')
+        position.move((3, 1), (2, 1))  # back to a known position
+        self.assertEqual(position.status(), '')
+
+        # status is not remembered until the turn is over
+        position = self.check('2k/SPs/K2 b -')
+        position.move((3, 2), (2, 1), None)
+        self.assertEqual(position.status(), '')
+        position.choose_promotion(True)
+        self.assertEqual(position.status(), 'check')  # i.e. by the gold
+        position.pop()
+        self.assertEqual(position.status(), '')
+        position.move((3, 2), (2, 1), None)  # same promotion choice pending
+        self.assertEqual(position.status(), '')
+        position.choose_promotion(False)
+        self.assertEqual(position.status(), '')
+        position.pop()
+        position.move((3, 2), (2, 1), True)
+        self.assertEqual(position.status(), 'check')  # i.e. remembered
+
     def check(self, sfen, expected_num_files=3, expected_num_ranks=3,
               expected_sfen=None, expected_status=''):
         position = Position(sfen, self._pieces)
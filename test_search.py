@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import threading
+import unittest
+
+from perft import STARTING_POSITIONS
+from pieces import Pieces
+from position import Position
+from search import Search
+from transposition import TranspositionTable
+
+
+class SearchTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._pieces = Pieces()
+
+    def test_mate_in_one(self):
+        position = Position('4k4/9/4P4/9/9/9/9/9/4K4 b G', self._pieces)
+        search = Search(position)
+        move, score = search.run(3)
+        self.assertEqual(position.unpack_move(move), ('G', (5, 2)))
+        self.assertEqual(score, Search.MATE_SCORE - 1)
+        self.assertEqual(search.depth, 1)  # no need to search deeper
+        self.assertEqual(search.principal_variation(), [move])
+
+    def test_mated(self):
+        position = Position('4k4/4G4/4P4/9/9/9/9/9/4K4 w -', self._pieces)
+        self.assertEqual(Search(position).run(2),
+                         (None, -Search.MATE_SCORE))
+
+    def test_capture(self):
+        position = Position('4k4/9/9/9/4r4/9/9/4R4/4K4 b -', self._pieces)
+        search = Search(position, TranspositionTable(1 << 16))
+        move, score = search.run(3)
+        self.assertEqual(position.unpack_move(move),
+                         ((5, 8), (5, 5), False))
+        self.assertEqual(score, 2 * 16)  # on board, then in hand
+        self.assertEqual(search.depth, 3)
+        self.assertGreater(search.nodes_per_second, 0)
+
+    def test_quiescence_bounds(self):
+        # checks answered by drops, then captured with check again, are not
+        #  searched forever (12348 nodes if drops were always searched)
+        position = Position('3S2+P2/+P1sP1P2l/s3k3p/L3p1Kp1/1P1gP3P/'
+                            '1+n5P1/5bn1n/g4R2L/2+p+pb4 b RLP2gsn4p',
+                            self._pieces)
+        search = Search(position)
+        move, score = search.run(1)
+        self.assertEqual(position.unpack_move(move), ('R', (5, 2)))
+        self.assertEqual(score, -2)
+        self.assertLess(search.nodes, 2000)
+
+    def test_budget(self):
+        position = Position(STARTING_POSITIONS['standard'], self._pieces)
+        search = Search(position)
+        move, _ = search.run(max_nodes=300)
+        self.assertEqual(search.nodes, 300)
+        self.assertIn(move, position.legal_moves())
+        self.assertEqual(str(position), STARTING_POSITIONS['standard'])
+
+        move, _ = search.run(max_time=0.1)
+        self.assertLess(search.elapsed, 1)
+        self.assertIn(move, position.legal_moves())
+
+        with self.assertRaisesRegex(ValueError, 'Invalid depth for search'):
+            search.run(0)
+
+    def test_stop(self):
+        position = Position(STARTING_POSITIONS['standard'], self._pieces)
+        search = Search(position)
+        stop = threading.Event()
+        reports = []
+
+        def report(depth, score, move):
+            reports.append(depth)
+            if depth == 2:
+                stop.set()
+
+        move, score = search.run(stop=stop, report=report)
+        self.assertEqual(reports, [1, 2])
+        self.assertEqual(search.depth, 2)
+        self.assertIn(move, position.legal_moves())
+        self.assertEqual(str(position), STARTING_POSITIONS['standard'])
+
+    def test_all_variants(self):
+        for variant, sfen in STARTING_POSITIONS.items():
+            position = Position(sfen, self._pieces)
+            move, score = Search(position).run(2)
+            self.assertIn(move, position.legal_moves(), variant)
+            self.assertEqual(score, 0, variant)
+
+
+if __name__ == '__main__':
+    unittest.main()
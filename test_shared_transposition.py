@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import pickle
+import unittest
+
+from concurrent.futures import ProcessPoolExecutor
+
+from shared_transposition import SharedTranspositionTable
+from test_transposition import TranspositionTableTests
+
+
+def _init_worker(table):
+    # i.e. attached once per worker process
+    global _worker_table
+    _worker_table = table
+    table.close_at_exit()
+
+
+def _store_and_probe(key):
+    # run by worker processes
+    _worker_table.store(key, 1, -key)
+    return _worker_table.probe(1)
+
+
+class SharedTranspositionTableTestCase(TranspositionTableTests,
+                                       unittest.TestCase):
+    table_class = SharedTranspositionTable
+
+    def make_table(self, *args):
+        table = super().make_table(*args)
+        self.addCleanup(table.close)
+        return table
+
+    def test_packing(self):
+        table = self.make_table(1000)
+        table.store(0, 0, 0)
+        self.assertEqual(table.probe(0), (0, 0))
+
+        table.store(2**64 - 1, table.MAX_DEPTH, -2**55)
+        self.assertEqual(table.probe(2**64 - 1), (table.MAX_DEPTH, -2**55))
+        table.store(2, 1, 2**55 - 1)
+        self.assertEqual(table.probe(2), (1, 2**55 - 1))
+
+        with self.assertRaisesRegex(ValueError, 'Invalid depth'):
+            table.store(42, table.MAX_DEPTH + 1, 0)
+        with self.assertRaisesRegex(ValueError, 'Invalid depth'):
+            table.store(42, -1, 0)
+        with self.assertRaisesRegex(ValueError, 'Invalid value'):
+            table.store(42, 1, 2**55)
+
+    def test_torn_entry(self):
+        table = self.make_table(1000)
+        table.store(42, 3, 1)
+        index = (42 & table._mask) * table.BUCKET_SIZE * 2
+        table._entries[index + 1] += 1  # i.e. data from another write
+        self.assertIsNone(table.probe(42))
+
+    def test_sharing(self):
+        table = self.make_table(1000)
+        table.store(1, 2, 3)
+        attached = pickle.loads(pickle.dumps(table))
+        self.assertEqual(attached.name, table.name)
+        self.assertEqual(attached.probe(1), (2, 3))
+        attached.close()
+        self.assertEqual(table.probe(1), (2, 3))  # i.e. still there
+
+        for method in multiprocessing.get_all_start_methods():
+            with ProcessPoolExecutor(
+                    2, multiprocessing.get_context(method),
+                    initializer=_init_worker,
+                    initargs=(table,)) as executor:
+                results = list(executor.map(_store_and_probe, [5, 6, 7]))
+            self.assertEqual(results, [(2, 3)] * 3)
+            for key in 5, 6, 7:
+                self.assertEqual(table.probe(key), (1, -key))
+
+
+if __name__ == '__main__':
+    unittest.main()
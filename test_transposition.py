@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from transposition import TranspositionTable
+
+
+class TranspositionTableTests:
+    # probe and store contract, run by the test case of each table class
+    table_class = None
+
+    def make_table(self, *args):
+        return self.table_class(*args)
+
+    def test_size(self):
+        table = self.make_table(1000)
+        self.assertEqual(len(table), 32)  # i.e. a power of two of buckets
+        self.assertEqual(table.usage(), 0)
+
+        with self.assertRaisesRegex(ValueError, 'Not enough memory'):
+            self.make_table(10)
+
+    def test_probe_and_store(self):
+        table = self.make_table()
+        self.assertIsNone(table.probe(42))
+        self.assertIsNone(table.probe(0))  # empty entries have a zero key
+
+        table.store(42, 3, -1234)
+        self.assertEqual(table.probe(42), (3, -1234))
+        table.store(42, 1, 5678)  # same position, shallower
+        self.assertEqual(table.probe(42), (1, 5678))
+
+        self.assertEqual((table.hits, table.misses), (2, 2))
+        self.assertEqual((table.stores, table.replacements), (2, 0))
+
+    def test_replacement(self):
+        table = self.make_table(4 * self.table_class.ENTRY_SIZE)
+        num_buckets = len(table) // table.BUCKET_SIZE
+        deep, other, another = 1, 1 + num_buckets, 1 + 2 * num_buckets
+
+        table.store(deep, 5, 1)
+        table.store(other, 2, 2)    # does not replace the deeper entry
+        table.store(another, 3, 3)  # always replaces the second entry
+        self.assertEqual(table.probe(deep), (5, 1))
+        self.assertIsNone(table.probe(other))
+        self.assertEqual(table.probe(another), (3, 3))
+        self.assertEqual(table.replacements, 1)
+
+        table.store(other, 7, 4)    # deeper, hence replaces the first entry
+        self.assertIsNone(table.probe(deep))
+        self.assertEqual(table.probe(other), (7, 4))
+
+        table.clear()
+        self.assertIsNone(table.probe(other))
+        self.assertEqual(table.usage(), 0)
+
+
+class TranspositionTableTestCase(TranspositionTableTests, unittest.TestCase):
+    table_class = TranspositionTable
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from pieces import Pieces
+from position import Position
+from tsume import Tsume
+
+
+class TsumeTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._pieces = Pieces()
+
+    def solve(self, sfen, expected, expected_line=None, **kwargs):
+        position = Position(sfen, self._pieces)
+        tsume = Tsume(position, **kwargs)
+        self.assertEqual(tsume.solve(), expected)
+        self.assertGreater(tsume.nodes, 0)
+
+        line = tsume.mate_line()
+        if expected_line is not None:
+            self.assertEqual(list(map(position.unpack_move, line)),
+                             expected_line)
+        self.assertEqual(str(position), sfen)
+        return tsume
+
+    def test_mate_in_one(self):
+        self.solve('4k4/9/4P4/9/9/9/9/9/9 b G', True, [('G', (5, 2))])
+        self.solve('4k4/9/4P4/9/9/9/9/9/9 b S', False, [])
+
+    def test_mate_in_three(self):
+        self.solve('ks3/2G2/5/5/5 b RN', True,
+                   [('R', (5, 3)), ((4, 1), (5, 2), False), ('N', (4, 3))])
+        self.solve('G1R2/5/3S1/5/k4 b 2G', True,
+                   [((3, 1), (3, 5), True),
+                    ((5, 5), (5, 4), False), ('G', (4, 4))])
+
+    def test_shortest_mate(self):
+        # other mates in 9 plies are found first
+        for sfen, expected_plies in (('2B2/4+B/1R3/5/1+B2k b N', 3),
+                                     ('5/4+R/2k2/5/4P b R', 5)):
+            tsume = self.solve(sfen, True)
+            self.assertEqual(len(tsume.mate_line()), expected_plies)
+
+    def test_no_pawn_drop_mate(self):
+        self.solve('7nk/7s1/8P/9/9/9/9/9/9 b P', False, [])
+        self.solve('7nk/7s1/8P/9/9/9/9/9/9 b G', True, [('G', (1, 2))])
+
+    def test_budget(self):
+        position = Position('ks3/2G2/5/5/5 b RN', self._pieces)
+        tsume = Tsume(position)
+        self.assertIsNone(tsume.solve(max_nodes=3))
+        self.assertEqual(tsume.nodes, 4)
+        self.assertTrue(tsume.solve())  # i.e. goes on where it stopped
+
+    def test_garbage_collection(self):
+        tsume = self.solve('p3k/5/5/3R1/3+B1 b 2S', True, max_entries=16)
+        self.assertGreater(tsume.collections, 0)
+        self.assertLessEqual(len(tsume), 16)
+        self.assertEqual(len(tsume.mate_line()), 3)
+
+        with self.assertRaisesRegex(ValueError, 'Not enough entries'):
+            Tsume(Position('ks3/2G2/5/5/5 b RN', self._pieces), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
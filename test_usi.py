@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import io
+import time
+import unittest
+
+from perft import STARTING_POSITIONS
+from pieces import Pieces
+from usi import Usi
+
+
+class UsiTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._pieces = Pieces()
+
+    def setUp(self):
+        self._output = io.StringIO()
+        self._usi = Usi(self._pieces, self._output)
+
+    def send(self, *lines):
+        for line in lines:
+            self.assertTrue(self._usi.handle(line))
+        self._usi.wait()
+
+        result = self._output.getvalue().splitlines()
+        self._output.seek(0)
+        self._output.truncate()
+        return result
+
+    def test_handshake(self):
+        lines = self.send('usi')
+        self.assertEqual(lines[0], 'id name kashogi')
+        self.assertEqual(lines[-1], 'usiok')
+        self.assertEqual(self.send('isready'), ['readyok'])
+        self.assertEqual(self.send('setoption name USI_Hash value 1'), [])
+        self.assertEqual(self.send('setoption name Foo value 1'),
+                         ['info string Invalid option: name Foo value 1'])
+        self.assertFalse(self._usi.handle('quit'))
+
+    def test_position(self):
+        self.send('position startpos moves 7g7f 3c3d 8h2b+ 3a2b B*4e')
+        game = self._usi.game
+        self.assertEqual(game.sfen, 'lnsgkg1nl/1r5s1/pppppp1pp/6p2/5B3/'
+                                    '2P6/PP1PPPPPP/7R1/LNSGKGSNL w b')
+
+        # only the new move is played
+        self.send('position startpos moves 7g7f 3c3d 8h2b+ 3a2b B*4e 5a6b')
+        self.assertIs(self._usi.game, game)
+        self.assertEqual(game.half_moves, 6)
+
+        # other moves: start again
+        self.send('position startpos moves 2g2f')
+        self.assertIsNot(self._usi.game, game)
+        self.assertEqual(self._usi.game.half_moves, 1)
+
+        self.assertEqual(self.send('position startpos moves 2g2f 5a5c'),
+                         ['info string Illegal move: 5a5c'])
+
+    def test_fairy_position(self):
+        self.send("setoption name Variant value tori",
+                  "position startpos moves 3d3c")
+        self.assertEqual(self._usi.game.in_hand(0), {"S'": 1})
+
+        self.send("position sfen 3k3/7/7/7/7/7/3K3 b S' 1 moves S'*4b")
+        self.assertEqual(self._usi.game.sfen, "3k3/3S'3/7/7/7/7/3K3 w -")
+        self.assertEqual(self._usi.format_move(
+            self._usi.game.pack_move(("S'", (4, 2)))), "S'*4b")
+
+    def test_go(self):
+        lines = self.send('position sfen 4k4/9/4P4/9/9/9/9/9/4K4 b G 1',
+                          'go depth 3')
+        self.assertEqual(len(lines), 2)
+        self.assertRegex(lines[0], r'^info depth 1 score mate 1 nodes 92 '
+                                   r'nps \d+ time \d+ pv G\*5b$')
+        self.assertEqual(lines[1], 'bestmove G*5b')
+
+        self.send('position startpos')
+        lines = self.send('go nodes 200')
+        self.assertRegex(lines[-1], r'^bestmove \d[a-i]\d[a-i]\+?$')
+
+        lines = self.send('position sfen 4k4/4G4/4P4/9/9/9/9/9/4K4 w -',
+                          'go movetime 100')
+        self.assertEqual(lines[-1], 'bestmove resign')
+
+    def test_stop(self):
+        self._usi.handle('position startpos')
+        self._usi.handle('go infinite')
+        self._usi.handle('stop')
+        lines = self.send()
+        self.assertRegex(lines[-1], r'^bestmove ')
+        self.assertEqual(self._usi.game.sfen, STARTING_POSITIONS['standard'])
+
+        # even once the search is over (mate found)
+        self._usi.handle('position sfen 4k4/9/4P4/9/9/9/9/9/4K4 b G 1')
+        self._usi.handle('go infinite')
+        time.sleep(0.5)
+        self.assertNotIn('bestmove', self._output.getvalue())
+        self._usi.handle('stop')
+        self.assertEqual(self.send()[-1], 'bestmove G*5b')
+
+
+if __name__ == '__main__':
+    unittest.main()
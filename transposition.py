@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+from array import array
+
+
+class TranspositionTable:
+    # Fixed-size hash table of (key, depth, value) entries, where key is a
+    #  Position key and value a signed 64-bit int. Entries go by pairs
+    #  (buckets) selected by the low bits of the key: the first entry of a
+    #  bucket is only replaced by a search at least as deep, the second one
+    #  always is.
+    ENTRY_SIZE = 8 + 8 + 1  # key, value and depth, in bytes
+    BUCKET_SIZE = 2
+    DEFAULT_MEMORY = 16 << 20
+
+    def __init__(self, memory=DEFAULT_MEMORY):
+        num_buckets = 1
+        while 2 * num_buckets * self.BUCKET_SIZE * self.ENTRY_SIZE <= memory:
+            num_buckets *= 2
+        if num_buckets * self.BUCKET_SIZE * self.ENTRY_SIZE > memory:
+            raise ValueError('Not enough memory for transposition table: {}'
+                             .format(memory))
+        self._mask = num_buckets - 1
+
+        size = num_buckets * self.BUCKET_SIZE
+        self._keys = array('Q', bytes(8 * size))
+        self._values = array('q', bytes(8 * size))
+        self._depths = array('b', [-1]) * size  # i.e. empty
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def __len__(self):
+        # i.e. number of entries, occupied or not
+        return len(self._keys)
+
+    def probe(self, key):
+        # returns (depth, value) stored for key, or None
+        index = (key & self._mask) * self.BUCKET_SIZE
+        for index in range(index, index + self.BUCKET_SIZE):
+            if self._keys[index] == key and self._depths[index] >= 0:
+                self.hits += 1
+                return self._depths[index], self._values[index]
+
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value):
+        index = (key & self._mask) * self.BUCKET_SIZE
+        if self._depths[index] > depth and self._keys[index] != key:
+            index += 1  # keep the deeper entry
+
+        if self._depths[index] >= 0 and self._keys[index] != key:
+            self.replacements += 1
+        self.stores += 1
+
+        self._keys[index] = key
+        self._depths[index] = depth
+        self._values[index] = value
+
+    def clear(self):
+        self._depths = array('b', [-1]) * len(self._depths)
+        self.hits = self.misses = self.stores = self.replacements = 0
+
+    def usage(self):
+        # i.e. fraction of occupied entries
+        return sum(depth >= 0 for depth in self._depths) / len(self._depths)
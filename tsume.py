@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+
+from perft import format_move
+from pieces import Pieces
+from position import Position
+
+
+class _Aborted(Exception):
+    pass
+
+
+class Tsume:
+    # Depth-first proof-number search (df-pn) of a forced mate by the player
+    #  to move, who has to give check at each of his turns (see
+    #  Position.checking_moves) while his opponent may play any legal move.
+    #  Proof and disproof numbers are remembered in a table indexed by
+    #  position key and bound, which is garbage collected once it holds
+    #  max_entries entries by forgetting the half of them with the smallest
+    #  subtrees. Once a mate is found, searches bounded to 1, 3, ... plies
+    #  look for a shorter one, so that the mate line is a shortest one.
+    INFINITY = 1 << 40
+    DEFAULT_MAX_ENTRIES = 1 << 20
+
+    def __init__(self, position, max_entries=DEFAULT_MAX_ENTRIES):
+        if max_entries < 2:
+            raise ValueError('Not enough entries for tsume table: {}'
+                             .format(max_entries))
+        self._position = position
+        self._max_entries = max_entries
+
+        # the following data structure is indexed by [(key, plies left)],
+        #  plies left being the bound on the number of plies until mate
+        #  (None if unbounded), and holds [proof number, disproof number,
+        #  number of plies until mate (once proven), work (i.e. number of
+        #  nodes searched below)]
+        self._table = {}
+        self._bound = 1  # i.e. next bound to try for a shorter mate
+        self._mate_bound = None  # i.e. length of the shortest mate found
+
+        self.nodes = 0
+        self.collections = 0  # i.e. number of garbage collections
+        self.elapsed = 0
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed else 0
+
+    def __len__(self):
+        # i.e. number of table entries
+        return len(self._table)
+
+    def solve(self, max_nodes=None):
+        # returns True if the player to move can force mate, False if not,
+        #  or None if max_nodes nodes were not enough to tell (or to make
+        #  sure that no mate is shorter than the one found)
+        start = time.perf_counter()
+        self._max_nodes = max_nodes
+        try:
+            result = self._prove(None)
+            if result:
+                plies = self._lookup(self._position.key, None)[2]
+                while self._bound < plies and not self._prove(self._bound):
+                    self._bound += 2  # i.e. mates have an odd number of plies
+                self._mate_bound = self._bound
+        except _Aborted:  # moves already popped on the way up
+            result = None
+        self.elapsed += time.perf_counter() - start
+        return result
+
+    def _prove(self, plies_left):
+        # returns whether the player to move can force mate within
+        #  plies_left plies (if not None)
+        self._path = set()
+        self._search(True, plies_left, self.INFINITY, self.INFINITY)
+        return self._lookup(self._position.key, plies_left)[0] == 0
+
+    def mate_line(self):
+        # i.e. moves and drops (packed, see Move) of the mate found by
+        #  solve() (a shortest one once it returned True), the player to
+        #  move choosing the shortest mate of his proof and his opponent the
+        #  longest one
+        position = self._position
+        result = []
+        keys = {position.key}  # i.e. not to be repeated
+        attacker = True
+        plies_left = self._mate_bound
+        while True:
+            move = self._best_child(attacker, keys, plies_left)
+            if move is None:
+                # e.g. forgotten by the garbage collector, prove it again
+                self._max_nodes = None
+                self._path = set(keys)
+                self._search(attacker, plies_left,
+                             self.INFINITY, self.INFINITY)
+                move = self._best_child(attacker, keys, plies_left)
+            if move is None:
+                break  # i.e. checkmate, or no mate at all
+
+            position.push(move)
+            result.append(move)
+            keys.add(position.key)
+            attacker = not attacker
+            plies_left = self._child_plies_left(plies_left)
+
+        for move in result:
+            position.pop()
+        return result
+
+    def _best_child(self, attacker, keys, plies_left):
+        # i.e. proven child not reaching one of keys, see mate_line
+        position = self._position
+        child_plies_left = self._child_plies_left(plies_left)
+        best_move = best_plies = None
+        moves = list(position.checking_moves()) if attacker else \
+            position.legal_moves()
+        for move in moves:
+            position.push(move)
+            key = position.key
+            proof, _, plies, _ = self._lookup(key, child_plies_left)
+            position.pop()
+            if proof != 0 or key in keys:
+                continue
+            if best_move is None or \
+               (plies < best_plies if attacker else plies > best_plies):
+                best_move, best_plies = move, plies
+        return best_move
+
+    @staticmethod
+    def _child_plies_left(plies_left):
+        return None if plies_left is None else plies_left - 1
+
+    def _lookup(self, key, plies_left):
+        return self._table.get((key, plies_left), (1, 1, None, 0))
+
+    def _store(self, key, plies_left, proof, disproof, plies, work):
+        if (key, plies_left) not in self._table and \
+           len(self._table) >= self._max_entries:
+            self._collect_garbage()
+        self._table[key, plies_left] = proof, disproof, plies, work
+
+    def _collect_garbage(self):
+        entries = sorted(self._table.items(), key=lambda item: item[1][3])
+        self._table = dict(entries[len(entries) // 2:])
+        self.collections += 1
+
+    def _search(self, attacker, plies_left, proof_threshold,
+                disproof_threshold):
+        # i.e. the MID procedure of df-pn for the current position, where
+        #  attacker tells whether it is an OR node (mating side to move)
+        #  and plies_left bounds the number of plies until mate (if not None)
+        self.nodes += 1
+        if self._max_nodes is not None and self.nodes > self._max_nodes:
+            raise _Aborted
+
+        position = self._position
+        key = position.key
+        nodes = self.nodes
+
+        if plies_left is not None and plies_left < (1 if attacker else 2) \
+           and (attacker or position.legal_moves()):
+            # i.e. no plies left to mate (disproven)
+            self._store(key, plies_left, self.INFINITY, 0, None, 1)
+            return
+
+        children = self._children(attacker, plies_left)
+        if not children:
+            # i.e. no more checks (disproven), or checkmate (proven)
+            if attacker:
+                self._store(key, plies_left, self.INFINITY, 0, None, 1)
+            else:
+                self._store(key, plies_left, 0, self.INFINITY, 0, 1)
+            return
+
+        self._path.add(key)
+        while True:
+            proof, disproof, best, second = self._numbers(attacker, children,
+                                                          plies_left)
+            if proof >= proof_threshold or disproof >= disproof_threshold:
+                break
+
+            move, child_key = children[best]
+            child_proof, child_disproof = self._lookup(
+                child_key, self._child_plies_left(plies_left))[:2]
+            if attacker:
+                thresholds = (min(proof_threshold, second + 1),
+                              disproof_threshold - disproof + child_disproof)
+            else:
+                thresholds = (proof_threshold - proof + child_proof,
+                              min(disproof_threshold, second + 1))
+
+            position.push(move)
+            try:
+                self._search(not attacker,
+                             self._child_plies_left(plies_left), *thresholds)
+            finally:
+                position.pop()
+        self._path.discard(key)
+
+        self._store(key, plies_left, proof, disproof,
+                    self._plies(attacker, children, plies_left)
+                    if proof == 0 else None,
+                    self.nodes - nodes + 1)
+
+    def _children(self, attacker, plies_left):
+        # returns [(move, key)] for each check of the attacker, or for each
+        #  legal move of the defender
+        position = self._position
+        child_plies_left = self._child_plies_left(plies_left)
+        moves = list(position.checking_moves()) if attacker else \
+            position.legal_moves()
+        result = []
+        for move in moves:
+            position.push(move)
+            key = position.key
+            if attacker and (key, child_plies_left) not in self._table and \
+               not position.legal_moves():
+                # i.e. mate in one
+                self._store(key, child_plies_left, 0, self.INFINITY, 0, 1)
+            result.append((move, key))
+            position.pop()
+        return result
+
+    def _numbers(self, attacker, children, plies_left):
+        # returns (proof number, disproof number, index of the child to
+        #  search next, second best child number), the numbers of children
+        #  on the current path being those of a failed attack
+        INFINITY = self.INFINITY
+        child_plies_left = self._child_plies_left(plies_left)
+        total = 0
+        best = None
+        minimum = second = INFINITY
+        for index, (move, key) in enumerate(children):
+            if key in self._path:
+                proof, disproof = INFINITY, 0
+            else:
+                proof, disproof = self._lookup(key, child_plies_left)[:2]
+            number, other = (proof, disproof) if attacker else \
+                (disproof, proof)
+
+            total = min(total + other, INFINITY)
+            if number < minimum or best is None:
+                second = minimum
+                minimum, best = number, index
+            elif number < second:
+                second = number
+
+        if attacker:
+            return minimum, total, best, second
+        return total, minimum, best, second
+
+    def _plies(self, attacker, children, plies_left):
+        # i.e. number of plies until mate of a proven node
+        child_plies_left = self._child_plies_left(plies_left)
+        plies = [self._lookup(key, child_plies_left)[2]
+                 for move, key in children
+                 if self._lookup(key, child_plies_left)[0] == 0]
+        return 1 + (min(plies) if attacker else max(plies))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('position', help='SFEN position')
+    parser.add_argument('--nodes', type=int, help='maximum number of nodes')
+    parser.add_argument('--entries', type=int,
+                        default=Tsume.DEFAULT_MAX_ENTRIES,
+                        help='maximum number of table entries (default: {})'
+                             .format(Tsume.DEFAULT_MAX_ENTRIES))
+    args = parser.parse_args()
+
+    position = Position(args.position, Pieces())
+    tsume = Tsume(position, args.entries)
+    result = tsume.solve(args.nodes)
+
+    if result:
+        line = tsume.mate_line()
+        print('Mate in {}: {}'.format(len(line), ' '.join(
+            format_move(position.unpack_move(move)) for move in line)))
+    else:
+        print('No mate' if result is False else 'Unknown')
+    print('Nodes: {}'.format(tsume.nodes))
+    print('Time: {:.3f}s ({:.0f} nodes/s)'.format(tsume.elapsed,
+                                                  tsume.nodes_per_second))
+    print('Table: {} entries, {} garbage collections'.format(
+        len(tsume), tsume.collections))
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+import re
+import sys
+import threading
+
+from game import Game
+from perft import STARTING_POSITIONS
+from pieces import Pieces
+from position import Position
+from search import Search
+from transposition import TranspositionTable
+
+
+class Usi:
+    # Engine side of the USI protocol, reading commands from input and
+    #  writing answers to output. Squares are written as file number then
+    #  rank letter (e.g. 7g, or 10k on bigger boards) and fairy pieces as
+    #  in SFEN (e.g. SW@*5e).
+    NAME = 'kashogi'
+    AUTHOR = 'agt-the-walker'
+    DEFAULT_HASH = 16  # MB
+    MAX_HASH = 4096
+    MOVES_TO_GO = 30  # i.e. share of the remaining time for a move
+
+    MOVE_REGEX = re.compile(r'(\d+)([a-z])(\d+)([a-z])(\+?)$')
+    DROP_REGEX = re.compile('(' + Position.UNPROMOTED_PIECE_REGEX +
+                            r')@?\*(\d+)([a-z])$')
+
+    def __init__(self, pieces, output=sys.stdout):
+        self._pieces = pieces
+        self._output = output
+
+        self._variant = 'standard'
+        self._hash = self.DEFAULT_HASH
+        self._table = None
+        self._game = None
+        self._sfen = None
+        self._moves = []  # i.e. USI moves played from _sfen
+
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def game(self):
+        return self._game
+
+    def run(self, input=sys.stdin):
+        for line in input:
+            if not self.handle(line):
+                break
+        self.stop()
+
+    def handle(self, line):
+        # returns False once the engine should quit
+        tokens = line.split()
+        if not tokens:
+            return True
+
+        command, args = tokens[0], tokens[1:]
+        if command == 'quit':
+            return False
+
+        handler = {
+            'usi': self._usi,
+            'isready': self._isready,
+            'setoption': self._setoption,
+            'usinewgame': self._usinewgame,
+            'position': self._position,
+            'go': self._go,
+            'stop': self._stop_command,
+        }.get(command)
+        if handler:
+            handler(args)
+        return True
+
+    def wait(self):
+        # i.e. until the current search (if any) is over
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def stop(self):
+        self._stop.set()
+        self.wait()
+
+    def _send(self, line):
+        print(line, file=self._output, flush=True)
+
+    def _usi(self, args):
+        self._send('id name {}'.format(self.NAME))
+        self._send('id author {}'.format(self.AUTHOR))
+        self._send('option name USI_Hash type spin default {} min 1 max {}'
+                   .format(self.DEFAULT_HASH, self.MAX_HASH))
+        self._send('option name Variant type combo default standard {}'
+                   .format(' '.join('var ' + variant
+                                    for variant in STARTING_POSITIONS)))
+        self._send('usiok')
+
+    def _isready(self, args):
+        if self._table is None:
+            self._table = TranspositionTable(self._hash << 20)
+        self._send('readyok')
+
+    def _setoption(self, args):
+        # i.e. setoption name <name> value <value>
+        name, value = (args[1], args[3]) if len(args) >= 4 and \
+            args[0] == 'name' and args[2] == 'value' else (None, None)
+        if name == 'USI_Hash' and value.isdigit() and \
+           1 <= int(value) <= self.MAX_HASH:
+            self._hash = int(value)
+            self._table = None
+        elif name == 'Variant' and value in STARTING_POSITIONS:
+            self._variant = value
+        else:
+            self._send('info string Invalid option: {}'.format(' '.join(args)))
+
+    def _usinewgame(self, args):
+        self.stop()
+        if self._table:
+            self._table.clear()
+        self._game = None
+
+    def _position(self, args):
+        # i.e. position (startpos | sfen <sfen>) [moves <move>...]
+        self.stop()
+        if 'moves' in args:
+            moves = args[args.index('moves') + 1:]
+            args = args[:args.index('moves')]
+        else:
+            moves = []
+
+        if args == ['startpos']:
+            sfen = STARTING_POSITIONS[self._variant]
+        elif args[:1] == ['sfen'] and len(args) >= 4:
+            sfen = ' '.join(args[1:4])  # move number is ignored
+        else:
+            self._send('info string Invalid position: {}'
+                       .format(' '.join(args)))
+            return
+
+        # the GUI usually sends the whole game again, one more move each time
+        if self._game is None or sfen != self._sfen or \
+           moves[:len(self._moves)] != self._moves:
+            try:
+                self._game = Game(sfen, self._pieces, False)
+            except ValueError as e:
+                self._game = None
+                self._send('info string {}'.format(e))
+                return
+            self._sfen = sfen
+            self._moves = []
+
+        for move in moves[len(self._moves):]:
+            try:
+                self._play(move)
+            except ValueError as e:
+                self._send('info string {}: {}'.format(e, move))
+                return
+            self._moves.append(move)
+
+    def _play(self, usi_move):
+        game = self._game
+        m = self.DROP_REGEX.match(usi_move)
+        if m:
+            game.drop(m.group(1).upper(),
+                      self._parse_square(m.group(2), m.group(3)))
+            return
+
+        m = self.MOVE_REGEX.match(usi_move)
+        if not m:
+            raise ValueError('Invalid move')
+        game.move(self._parse_square(m.group(1), m.group(2)),
+                  self._parse_square(m.group(3), m.group(4)),
+                  m.group(5) == '+')
+
+    @staticmethod
+    def _parse_square(file, rank):
+        return int(file), ord(rank) - ord('a') + 1
+
+    def format_move(self, move):
+        # i.e. USI notation of a packed move or drop (see Move)
+        move = self._game.unpack_move(move)
+        if isinstance(move[0], str):
+            abbrev, dest_square = move
+            return '{}*{}'.format(self._game.sfen_piece(abbrev),
+                                  self._format_square(dest_square))
+        else:
+            square, dest_square, promotes = move
+            return '{}{}{}'.format(self._format_square(square),
+                                   self._format_square(dest_square),
+                                   '+' if promotes else '')
+
+    @staticmethod
+    def _format_square(square):
+        file, rank = square
+        return '{}{}'.format(file, chr(ord('a') + rank - 1))
+
+    def _go(self, args):
+        self.stop()
+        if self._game is None:
+            self._position(['startpos'])
+        if self._table is None:
+            self._table = TranspositionTable(self._hash << 20)
+
+        options = {}
+        for name, value in zip(args, args[1:] + ['']):
+            if value.isdigit():
+                options[name] = int(value)
+
+        infinite = 'infinite' in args
+        max_time = None if infinite else self._time_budget(options)
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._search,
+            args=(options.get('depth', Search.MAX_DEPTH),
+                  options.get('nodes'), max_time, infinite))
+        self._thread.start()
+
+    def _time_budget(self, options):
+        # returns the number of seconds to think, or None if unlimited
+        if 'movetime' in options:
+            return options['movetime'] / 1000
+
+        player = 'b' if self._game.player_to_move == 0 else 'w'
+        remaining = options.get(player + 'time')
+        if remaining is None:
+            return None
+
+        budget = remaining / self.MOVES_TO_GO + \
+            options.get(player + 'inc', 0) + options.get('byoyomi', 0)
+        return min(budget, remaining + options.get('byoyomi', 0)) / 1000 * 0.9
+
+    def _search(self, max_depth, max_nodes, max_time, infinite):
+        search = Search(self._game.position, self._table)
+
+        def report(depth, score, move):
+            if abs(score) > Search.MATE_SCORE - 2 * Search.MAX_DEPTH:
+                plies = Search.MATE_SCORE - abs(score)
+                score = 'mate {}'.format(plies if score > 0 else -plies)
+            else:
+                score = 'cp {}'.format(score * 100)  # i.e. pawn = 100
+            self._send('info depth {} score {} nodes {} nps {:.0f} time {:.0f}'
+                       ' pv {}'.format(depth, score, search.nodes,
+                                       search.nodes_per_second,
+                                       search.elapsed * 1000,
+                                       ' '.join(map(
+                                           self.format_move,
+                                           search.principal_variation()))))
+
+        move = None
+        if self._game.result()[0] is None:  # i.e. game not decided yet
+            move, score = search.run(max_depth, max_nodes, max_time,
+                                     self._stop, report)
+        if infinite:
+            self._stop.wait()  # i.e. no bestmove before the stop command
+        self._send('bestmove {}'.format(
+            self.format_move(move) if move else 'resign'))
+
+    def _stop_command(self, args):
+        self.stop()
+
+
+if __name__ == '__main__':
+    Usi(Pieces()).run()